@@ -0,0 +1,94 @@
+"""
+Compare the per-rerun cost of displaying the overview charts with st.altair_chart, which validates and serializes the
+Altair chart on every rerun, with displaying their cached compiled specs and Arrow tables.
+Both are measured with the marshalling Streamlit runs for st.altair_chart and st.vega_lite_chart, and the payload
+is the size of the chart message sent to the browser.
+Run from the repository root with `python -m benchmarks.bench_chart_specs [--rows 20000] [--repeat 20]`. Synthetic
+HPA-shaped data is used unless a snapshot is given with --directory or an HPA file with --source.
+"""
+import argparse
+import time
+from typing import Callable
+
+from streamlit.elements import arrow_altair, arrow_vega_lite
+from streamlit.proto.ArrowVegaLiteChart_pb2 import ArrowVegaLiteChart
+
+import views.chromosome_view
+from benchmarks.bench_memory import synthetic_data
+from data.dataset import build_dataset
+from data.filters import region_proteins
+from data.intervals import chromosome_extent
+from data.preparation import prepare_data
+from data.snapshot import prepare_source, read_snapshot
+from streamlit_app import color_scale
+from views.cancer_view import build_cancer_chart
+from views.chart_specs import compile_chart
+from views.chromosome_view import build_chromosome_view_data
+
+
+def measure(marshall: Callable[[ArrowVegaLiteChart], None], repeat: int) -> tuple[float, int]:
+    """
+    Time a chart marshalling function, and get the size of the message it builds.
+    """
+    start = time.perf_counter()
+    for _ in range(repeat):
+        proto = ArrowVegaLiteChart()
+        marshall(proto)
+    return (time.perf_counter() - start) / repeat, proto.ByteSize()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=20000, help="Number of rows of the synthetic data.")
+    parser.add_argument("--directory", default=None,
+                        help="Optional directory containing a snapshot, used instead of synthetic data.")
+    parser.add_argument("--source", default=None,
+                        help="Optional local path or URL of the proteinatlas.tsv(.zip) file, used instead of "
+                             "synthetic data.")
+    parser.add_argument("--repeat", type=int, default=20, help="Number of simulated reruns.")
+    args = parser.parse_args()
+
+    if args.source is not None:
+        data, _ = prepare_source(args.source)
+    elif args.directory is not None:
+        data = read_snapshot(args.directory)
+        if data is None:
+            parser.error(f"No snapshot in {args.directory}, build one with `python -m data.snapshot` first.")
+    else:
+        data = prepare_data(synthetic_data(args.rows))
+    dataset = build_dataset(data)
+    cancer = dataset.cancer_types[0]
+    protein_selection = ["Enzymes", "Transporters", "Transcription factors"]
+    chromosome_end = chromosome_extent(dataset.interval_index, "1") + 1
+    gene_region_end = 20_000_000
+    if args.source is None and args.directory is None:
+        # Synthetic data has far fewer prognostic genes per chromosome than the HPA data, so chromosome 1 is drawn as a
+        # density from all of its filtered genes, and its genes are listed over its first half.
+        chromosome_rows, _ = region_proteins(dataset, cancer, "Favorable", protein_selection, "1", 0, chromosome_end)
+        views.chromosome_view.detail_gene_limit = max(len(chromosome_rows) - 1, 0)
+        gene_region_end = chromosome_end // 2
+    charts = {
+        "cancer view": lambda: build_cancer_chart(dataset, cancer, "Favorable", protein_selection, color_scale),
+        "chromosome 1, density": lambda: build_chromosome_view_data(
+            dataset, cancer, "Favorable", protein_selection, "1", 0, chromosome_end, color_scale
+        )[1],
+        f"chromosome 1, 0-{gene_region_end // 1_000_000} Mb genes": lambda: build_chromosome_view_data(
+            dataset, cancer, "Favorable", protein_selection, "1", 0, gene_region_end, color_scale
+        )[1]
+    }
+
+    for name, build_chart in charts.items():
+        chart = build_chart()
+        compiled_chart = compile_chart(build_chart())
+        altair_time, altair_bytes = measure(lambda proto: arrow_altair.marshall(proto, chart), args.repeat)
+        compiled_time, compiled_bytes = measure(
+            lambda proto: arrow_vega_lite.marshall(proto, dict(compiled_chart.spec, datasets=compiled_chart.datasets)),
+            args.repeat
+        )
+        print(f"{name:>29}: st.altair_chart {altair_time * 1000:7.2f} ms {altair_bytes / 1024:7.1f} KiB  "
+              f"compiled {compiled_time * 1000:7.2f} ms {compiled_bytes / 1024:7.1f} KiB  "
+              f"speedup {altair_time / compiled_time:6.1f}x")
+
+
+if __name__ == "__main__":
+    main()
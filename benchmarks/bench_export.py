@@ -0,0 +1,48 @@
+"""
+Compare the batch export run in-process with the export split across a process pool, on synthetic HPA-shaped data.
+Splitting only pays off once the export takes longer than starting the workers and sending them the data, which is
+why export_statistics only uses the pool from export_parallel_min_rows gene rows.
+Run from the repository root with `python -m benchmarks.bench_export [--rows 20000] [--workers N]`.
+"""
+import argparse
+import os
+import tempfile
+import time
+
+import data.export
+from benchmarks.bench_memory import synthetic_data
+from data.dataset import build_dataset
+from data.export import export_statistics, prognoses
+from data.preparation import prepare_data
+from data.prognostics import prognostic_rows
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=20000, help="Number of rows of the synthetic data.")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="Number of worker processes.")
+    parser.add_argument("--repeat", type=int, default=3, help="Number of exports per mode.")
+    args = parser.parse_args()
+
+    dataset = build_dataset(prepare_data(synthetic_data(args.rows)))
+    grid_rows = sum(len(prognostic_rows(dataset.prognostic_index, cancer, prognosis))
+                    for cancer in dataset.cancer_types for prognosis in prognoses)
+    print(f"{len(dataset.data)} genes, {grid_rows} gene rows over {len(dataset.cancer_types)} cancer types, "
+          f"pool used from {data.export.export_parallel_min_rows} gene rows")
+
+    default_min_rows = data.export.export_parallel_min_rows
+    with tempfile.TemporaryDirectory() as output:
+        for name, workers, min_rows in [("in-process", 1, default_min_rows),
+                                        (f"{args.workers} workers", args.workers, 0)]:
+            data.export.export_parallel_min_rows = min_rows
+            times = []
+            for _ in range(args.repeat):
+                start = time.perf_counter()
+                export_statistics(dataset, output, workers=workers)
+                times.append(time.perf_counter() - start)
+            print(f"{name:>12}: best {min(times):6.2f} s  mean {sum(times) / len(times):6.2f} s")
+    data.export.export_parallel_min_rows = default_min_rows
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+"""
+Check the shared HTTP client against a local stub server, and measure how long its requests take.
+Concurrent identical GETs must be coalesced into one request to the server, responses with a 503 or 429 status must
+be retried, and no more than the per-host limit of requests may reach the server at once.
+Run from the repository root with `python -m benchmarks.bench_http_client [--delay 0.2] [--sessions 16]`.
+Exits with a non-zero status if a check fails.
+"""
+import argparse
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from data.http_client import HTTPClient, http_host_concurrency
+
+
+class StubServer(ThreadingHTTPServer):
+    """
+    Server answering every GET after a delay, counting the requests per path and the peak of concurrent requests.
+    Paths starting with /status/<code> fail with that status on the first two requests.
+    """
+    daemon_threads = True
+
+    def __init__(self, delay: float):
+        super().__init__(("127.0.0.1", 0), StubHandler)
+        self.delay = delay
+        self.hits: dict[str, int] = {}
+        self.active = 0
+        self.peak = 0
+        self.lock = threading.Lock()
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.server_port}"
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    server: StubServer
+
+    def log_message(self, *args) -> None:
+        pass
+
+    def do_GET(self) -> None:
+        with self.server.lock:
+            hit = self.server.hits[self.path] = self.server.hits.get(self.path, 0) + 1
+            self.server.active += 1
+            self.server.peak = max(self.server.peak, self.server.active)
+        try:
+            if self.path.startswith("/status/") and hit <= 2:
+                self.send_response(int(self.path.split("/")[2]))
+                self.send_header("Retry-After", "0")
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+            time.sleep(self.server.delay)
+            body = self.path.encode()
+            self.send_response(200)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        finally:
+            with self.server.lock:
+                self.server.active -= 1
+
+
+def check(name: str, passed: bool, details: str) -> bool:
+    """
+    Print the outcome of a check.
+    """
+    print(f"{'ok  ' if passed else 'FAIL'} {name:>28}: {details}")
+    return passed
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--delay", type=float, default=0.2, help="Seconds the stub server takes per response.")
+    parser.add_argument("--sessions", type=int, default=16, help="Number of concurrent sessions.")
+    parser.add_argument("--host-concurrency", type=int, default=http_host_concurrency,
+                        help="Maximum number of concurrent requests per host.")
+    args = parser.parse_args()
+
+    server = StubServer(args.delay)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    client = HTTPClient(backoff=0.01, host_concurrency=args.host_concurrency)
+    passed = True
+
+    with ThreadPoolExecutor(args.sessions) as pool:
+        start = time.perf_counter()
+        bodies = list(pool.map(lambda _: client.get(f"{server.url}/same").text, range(args.sessions)))
+        elapsed = time.perf_counter() - start
+    passed &= check("identical GETs coalesced", server.hits["/same"] == 1 and set(bodies) == {"/same"},
+                    f"{args.sessions} concurrent GETs, {server.hits['/same']} server request(s), "
+                    f"{client.coalesced} coalesced, {elapsed * 1000:.0f} ms")
+
+    for status in [503, 429]:
+        start = time.perf_counter()
+        response = client.get(f"{server.url}/status/{status}")
+        elapsed = time.perf_counter() - start
+        passed &= check(f"{status} retried", response.status_code == 200,
+                        f"status {response.status_code} after {server.hits[f'/status/{status}']} server requests, "
+                        f"{elapsed * 1000:.0f} ms")
+
+    with server.lock:
+        server.peak = 0
+    with ThreadPoolExecutor(args.sessions) as pool:
+        start = time.perf_counter()
+        list(pool.map(lambda i: client.get(f"{server.url}/distinct/{i}"), range(args.sessions)))
+        elapsed = time.perf_counter() - start
+    passed &= check("per-host limit", server.peak <= args.host_concurrency,
+                    f"{args.sessions} distinct GETs, at most {server.peak} concurrent of {args.host_concurrency} "
+                    f"allowed, {elapsed * 1000:.0f} ms")
+
+    server.shutdown()
+    if not passed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,149 @@
+"""
+Measure the memory held by the shared HPA dataset and by each session, and check them against the targets.
+Run from the repository root with `python -m benchmarks.bench_memory [--rows N] [--source proteinatlas.tsv.zip]
+[--sessions N]`. Without --source, a synthetic HPA-shaped DataFrame is generated. The full HPA download is
+measured with `--source https://www.proteinatlas.org/download/proteinatlas.tsv.zip`.
+Exits with a non-zero status if a target is exceeded.
+"""
+import argparse
+import io
+import sys
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+from benchmarks.bench_prognostics import cancer_types
+from data.aggregates import class_counts
+from data.dataset import HPADataset, build_dataset
+from data.preparation import prepare_data, protein_class_priority
+from data.prognostics import prognostic_rows
+from data.snapshot import read_source
+
+# Memory of the dataset shared by all sessions of a worker, and additional memory per session.
+dataset_memory_target = 64 * 1024 ** 2
+session_memory_target = 1024 ** 2
+
+
+def synthetic_data(rows: int, seed: int = 0) -> pd.DataFrame:
+    """
+    Generate a raw HPA-shaped DataFrame, with the columns used by the app and text columns standing in for the
+    other columns of the HPA file.
+    """
+    rng = np.random.default_rng(seed)
+    ids = np.arange(rows)
+    starts = rng.integers(1, 240_000_000, size=rows)
+    chromosomes = np.array([str(x) for x in range(1, 23)] + ["X", "Y", "MT", "Unmapped"], dtype=object)
+    prognostics = np.array(["unprognostic (1.23e-1)", "prognostic favorable (4.56e-4)",
+                            "prognostic unfavorable (7.89e-5)", np.nan], dtype=object)
+    classes = np.array(protein_class_priority, dtype=object)
+    expression_labels = {"RNA single cell type specific nTPM": ["t-cells", "b-cells", "hepatocytes", "neurons"],
+                         "RNA tissue specific nTPM": ["liver", "brain", "lung", "heart muscle"]}
+
+    def text(prefix: str, missing: float = 0.0) -> np.ndarray:
+        values = np.char.add(prefix, ids.astype(str)).astype(object)
+        values[rng.random(rows) < missing] = np.nan
+        return values
+
+    data = pd.DataFrame({
+        "Gene": text("GENE"),
+        "Gene synonym": text("SYN", missing=0.5),
+        "Ensembl": text("ENSG"),
+        "Gene description": text("Description of gene "),
+        "Uniprot": text("P", missing=0.05),
+        "Chromosome": chromosomes[rng.integers(len(chromosomes), size=rows)],
+        "Position": [f"{start}-{start + length}" for start, length in zip(starts, rng.integers(100, 2_000_000, rows))],
+        "Protein class": [", ".join(classes[rng.choice(len(classes), size=rng.integers(1, 5), replace=False)])
+                          for _ in range(rows)],
+        "Biological process": text("Process ", missing=0.5),
+        "Molecular function": text("Function ", missing=0.5),
+        "Disease involvement": text("Disease ", missing=0.7),
+        **{column: [";".join(f"{label}: {value:.1f}" for label, value in zip(labels, rng.random(len(labels)) * 100))
+                    if present else np.nan for present in rng.random(rows) < 0.4]
+           for column, labels in expression_labels.items()},
+        **{f"Pathology prognostics - {cancer}": prognostics[rng.choice(len(prognostics), size=rows,
+                                                                       p=[0.4, 0.05, 0.05, 0.5])]
+           for cancer in cancer_types},
+        **{f"Other column {i}": text(f"Value {i} of gene ") for i in range(60)}
+    })
+    return data
+
+
+def dataset_memory(dataset: HPADataset) -> int:
+    """
+    Approximate the memory held by a dataset: its DataFrames and the numpy arrays of its indexes.
+    """
+    total = 0
+    pending = [dataset.__dict__]
+    while pending:
+        value = pending.pop()
+        if isinstance(value, pd.DataFrame):
+            total += int(value.memory_usage(deep=True).sum())
+        elif isinstance(value, np.ndarray):
+            total += value.nbytes
+        elif isinstance(value, dict):
+            total += sys.getsizeof(value)
+            pending.extend(value.values())
+        elif isinstance(value, (list, tuple)):
+            total += sys.getsizeof(value)
+            pending.extend(value)
+        else:
+            total += sys.getsizeof(value)
+    return total
+
+
+def simulate_session(dataset: HPADataset, cancer: str, prognosis: str) -> dict:
+    """
+    Build the session state that main() and the views hold for one session.
+    """
+    session_state = {
+        "dataset": dataset,
+        "cancer_selection": cancer,
+        "prognosis_selection": prognosis,
+        "protein_selection": ["Enzymes", "Transporters", "Transcription factors"]
+    }
+    prognostic_rows(dataset.prognostic_index, cancer, prognosis)
+    class_counts(dataset.class_count_cube, cancer, prognosis, session_state["protein_selection"])
+    return session_state
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=20000, help="Number of rows of the synthetic data.")
+    parser.add_argument("--source", default=None,
+                        help="Optional local path or URL of the proteinatlas.tsv(.zip) file, used instead of "
+                             "synthetic data.")
+    parser.add_argument("--sessions", type=int, default=50)
+    args = parser.parse_args()
+
+    if args.source is None:
+        raw = synthetic_data(args.rows)
+    else:
+        compression = "zip" if args.source.endswith(".zip") else "gzip" if args.source.endswith(".gz") else None
+        raw = pd.read_csv(io.BytesIO(read_source(args.source)), compression=compression, sep="\t")
+    raw_memory = int(raw.memory_usage(deep=True).sum())
+    data = prepare_data(raw)
+    frame_memory = int(data.memory_usage(deep=True).sum())
+    dataset = build_dataset(data)
+    shared_memory = dataset_memory(dataset)
+
+    tracemalloc.start()
+    baseline = tracemalloc.get_traced_memory()[0]
+    sessions = [simulate_session(dataset, dataset.cancer_types[i % len(dataset.cancer_types)],
+                                 ["Favorable", "Unfavorable"][i % 2]) for i in range(args.sessions)]
+    per_session = (tracemalloc.get_traced_memory()[0] - baseline) / len(sessions)
+    tracemalloc.stop()
+
+    print(f"{len(data)} rows")
+    print(f"raw HPA frame       {raw_memory / 1024 ** 2:10.1f} MiB ({raw.shape[1]} columns)")
+    print(f"prepared frame      {frame_memory / 1024 ** 2:10.1f} MiB ({data.shape[1]} columns)")
+    print(f"shared dataset      {shared_memory / 1024 ** 2:10.1f} MiB "
+          f"(target {dataset_memory_target / 1024 ** 2:.0f} MiB)")
+    print(f"per session         {per_session / 1024:10.1f} KiB (target {session_memory_target / 1024:.0f} KiB)")
+
+    if shared_memory > dataset_memory_target or per_session > session_memory_target:
+        sys.exit("Memory target exceeded")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+"""
+Compare the vectorized prognostics derivation with the original row-wise implementation.
+Run from the repository root with `python -m benchmarks.bench_prognostics [--rows N] [--source proteinatlas.tsv]`.
+Without --source, a synthetic HPA-shaped DataFrame is generated.
+"""
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+from data.prognostics import generate_prognostics
+
+cancer_types = ["Breast cancer", "Cervical cancer", "Colorectal cancer", "Endometrial cancer", "Glioma",
+                "Head and neck cancer", "Liver cancer", "Lung cancer", "Melanoma", "Ovarian cancer",
+                "Pancreatic cancer", "Prostate cancer", "Renal cancer", "Stomach cancer", "Testis cancer",
+                "Thyroid cancer", "Urothelial cancer"]
+
+
+def generate_prognostic_data(row: pd.Series, prognostic_type: str) -> str:
+    """
+    The original row-wise implementation, applied with data.apply(..., axis=1).
+    """
+    prognostic_fields = row[pd.Series(row.index).apply(lambda x: "Pathology prognostics" in x).values]
+    prognostics_row = row[prognostic_fields.index]
+    prognostics = prognostics_row[prognostics_row.apply(lambda x: prognostic_type in str(x).lower().split())].index
+    return ",".join(map(lambda x: x.split("-")[1].strip(), prognostics))
+
+
+def synthetic_data(rows: int, seed: int = 0) -> pd.DataFrame:
+    """
+    Generate a DataFrame with HPA-like "Pathology prognostics" columns.
+    """
+    rng = np.random.default_rng(seed)
+    values = np.array(["unprognostic (1.23e-1)", "prognostic favorable (4.56e-4)",
+                       "prognostic unfavorable (7.89e-5)", np.nan], dtype=object)
+    data = pd.DataFrame({"Gene": [f"GENE{i}" for i in range(rows)]})
+    for cancer in cancer_types:
+        data[f"Pathology prognostics - {cancer}"] = values[rng.choice(len(values), size=rows, p=[0.4, 0.05, 0.05, 0.5])]
+    return data
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=20000)
+    parser.add_argument("--source", default=None, help="Optional local proteinatlas.tsv(.zip) file.")
+    args = parser.parse_args()
+
+    data = synthetic_data(args.rows) if args.source is None else pd.read_csv(args.source, sep="\t")
+    print(f"{len(data)} rows")
+
+    for prognostic_type in ["favorable", "unfavorable"]:
+        start = time.perf_counter()
+        expected = data.apply(lambda row: generate_prognostic_data(row, prognostic_type=prognostic_type), axis=1)
+        rowwise_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        result = generate_prognostics(data, prognostic_type=prognostic_type)
+        vectorized_time = time.perf_counter() - start
+
+        assert result.equals(expected), f"{prognostic_type} prognostics differ from the row-wise implementation"
+        print(f"{prognostic_type:>12}: row-wise {rowwise_time:8.3f}s  vectorized {vectorized_time:8.3f}s  "
+              f"speedup {rowwise_time / vectorized_time:6.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+"""
+Measure a refresh of the HPA data to a new release, and check which cached results it invalidates.
+The new release only changes the nTPM values of a few genes of synthetic HPA-shaped data. The top expressed genes
+of the filters including these genes must be computed again, and those of the other filters kept.
+Run from the repository root with `python -m benchmarks.bench_refresh [--rows 20000] [--changed 5]`.
+Exits with a non-zero status if a check fails.
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+from benchmarks.bench_http_client import check
+from benchmarks.bench_memory import synthetic_data
+from data.dataset import build_dataset
+from data.expression import tpm_column_names
+from data.filter_cache import FilterCache, filter_key
+from data.refresh import DatasetRefresher
+from data.sequence_store import SequenceStore
+from data.snapshot import prepare_source, write_snapshot
+from streamlit_app import invalidate_changed_proteins
+from views.cancer_view import build_top_expressed_genes
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=20000, help="Number of rows of the synthetic data.")
+    parser.add_argument("--changed", type=int, default=5, help="Number of genes whose nTPM values change.")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        raw = synthetic_data(args.rows)
+        raw.to_csv(os.path.join(directory, "release-1.tsv"), sep="\t", index=False)
+        data, metadata = prepare_source(os.path.join(directory, "release-1.tsv"))
+        write_snapshot(data, metadata, directory)
+        dataset = build_dataset(data)
+
+        # Cache the top expressed genes of every filter, then change the tissue nTPM of genes of the first filter.
+        by, column = "tissue", tpm_column_names["tissue"]
+        label = dataset.expression[by].labels[0]
+        filter_cache = FilterCache(max_entries=len(dataset.prognostic_index))
+        keys = {(cancer, prognosis): filter_key("expression", cancer, prognosis, [], by, label)
+                for cancer, prognosis in dataset.prognostic_index}
+        for (cancer, prognosis), key in keys.items():
+            filter_cache.get(dataset.version, key,
+                             lambda: build_top_expressed_genes(dataset, cancer, prognosis, [], by, label))
+        changed_filter = next(filter_key for filter_key, rows in dataset.prognostic_index.items() if len(rows))
+        changed_genes = dataset.data["Ensembl"].iloc[dataset.prognostic_index[changed_filter][:args.changed]]
+        raw.loc[raw["Ensembl"].isin(changed_genes), column] = f"{label.lower()}: 100000.0"
+        raw.to_csv(os.path.join(directory, "release-2.tsv"), sep="\t", index=False)
+
+        refresher = DatasetRefresher(dataset, source=os.path.join(directory, "release-2.tsv"), directory=directory)
+        refresher.add_listener(lambda diff, old, new: invalidate_changed_proteins(
+            filter_cache, SequenceStore(os.path.join(directory, "sequences")), diff, old, new))
+        start = time.perf_counter()
+        diff = refresher.refresh()
+        elapsed = time.perf_counter() - start
+
+        recomputed = set()
+        for filter_pair, key in keys.items():
+            filter_cache.get(refresher.dataset.version, key, lambda: recomputed.add(filter_pair))
+        affected = {filter_pair for filter_pair, rows in refresher.dataset.prognostic_index.items()
+                    if refresher.dataset.data["Ensembl"].iloc[rows].isin(changed_genes).any()}
+        top_genes = build_top_expressed_genes(refresher.dataset, *changed_filter, [], by, label)
+
+    passed = check("nTPM changes in diff", diff is not None and set(diff["Ensembl"]) == set(changed_genes)
+                   and (diff["Changed columns"] == column).all(),
+                   f"{0 if diff is None else len(diff)} changed genes of {len(changed_genes)}, "
+                   f"refreshed in {elapsed:.2f} s")
+    passed &= check("affected filters recomputed", recomputed == affected,
+                    f"{len(recomputed)} of {len(keys)} filters recomputed, {len(affected)} include a changed gene")
+    passed &= check("new nTPM ranked first", top_genes["nTPM"].iloc[0] == 100000,
+                    f"top {label} nTPM of {', '.join(changed_filter)}: {top_genes['nTPM'].iloc[0]:.1f}")
+    if not passed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+"""
+Compare the vectorized residue table construction with the original per-residue DataFrame lookups.
+Run from the repository root with `python -m benchmarks.bench_sequence_table [--lengths 100 1000 10000]`.
+"""
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+from views.protein_sequence_view import amino_acid_info, build_sequence_table
+
+
+def build_sequence_table_rowwise(seq: str) -> pd.DataFrame:
+    """
+    The original implementation from generate_sequence_visualization. Fails on non-standard residues.
+    """
+    sequence_table = pd.DataFrame({"amino_acid": list(seq),
+                                   "position": [x for x in range(len(seq))]})
+    sequence_table["amino_acid_name"] = sequence_table["amino_acid"].apply(
+        lambda x: amino_acid_info[amino_acid_info["one_letter_code"] == x]["full_name"].iloc[0]
+    )
+    sequence_table["amino_acid_three_letter"] = sequence_table["amino_acid"].apply(
+        lambda x: amino_acid_info[amino_acid_info["one_letter_code"] == x]["three_letter_code"].iloc[0]
+    )
+    sequence_table["color"] = sequence_table["amino_acid"].apply(
+        lambda x: amino_acid_info[amino_acid_info["one_letter_code"] == x]["color"].iloc[0]
+    )
+    sequence_table["position"] += 1
+    sequence_table["empty_string"] = ""
+    return sequence_table
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--lengths", type=int, nargs="+", default=[100, 1000, 10000],
+                        help="Sequence lengths to benchmark. TTN, the longest human protein, has 34350 residues.")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    for length in args.lengths:
+        seq = "".join(rng.choice(amino_acid_info["one_letter_code"].to_numpy(), size=length))
+
+        start = time.perf_counter()
+        expected = build_sequence_table_rowwise(seq)
+        rowwise_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        result = build_sequence_table(seq)
+        vectorized_time = time.perf_counter() - start
+
+        pd.testing.assert_frame_equal(result, expected, check_dtype=False)
+        print(f"{length:>8} residues: row-wise {rowwise_time:8.3f}s  vectorized {vectorized_time:8.4f}s  "
+              f"speedup {rowwise_time / vectorized_time:8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""
+Measure the latency and accuracy of the local PDB sequence similarity search on a fixed query set.
+Queries are indexed sequences picked with a fixed seed, with a fraction of their residues substituted and their ends
+trimmed, so the entry of the original sequence is the expected best hit.
+Run from the repository root with `python -m benchmarks.bench_similarity [pdb_seqres.txt.gz] [--queries 200]`.
+Without a seqres file, synthetic chains are generated in families of homologous sequences.
+"""
+import argparse
+import time
+from typing import Iterator
+
+import numpy as np
+
+from data.similarity import (build_similarity_index, index_sequence, kmer_alphabet, read_seqres,
+                             search_similar_sequences)
+
+
+def mutate(sequence: str, substitution_rate: float, rng: np.random.Generator) -> str:
+    """
+    Substitute random residues of a sequence and trim up to a tenth of it on both ends.
+    """
+    residues = np.array(list(sequence))
+    substituted = rng.random(len(residues)) < substitution_rate
+    residues[substituted] = rng.choice(list(kmer_alphabet), substituted.sum())
+    trim = rng.integers(0, len(residues) // 10 + 1, size=2)
+    return "".join(residues[trim[0]:len(residues) - trim[1]])
+
+
+def synthetic_chains(count: int, family_size: int = 4, family_divergence: float = 0.3,
+                     seed: int = 0) -> Iterator[tuple[str, str]]:
+    """
+    Generate PDB-like chains: random sequences with log-normal lengths, each followed by homologs with a fraction
+    of their residues substituted, which compete with the original sequence for the best hit.
+    """
+    rng = np.random.default_rng(seed)
+    alphabet = np.frombuffer(kmer_alphabet.encode(), dtype=np.uint8)
+    for family_start in range(0, count, family_size):
+        length = int(np.clip(rng.lognormal(np.log(250), 0.6), 30, 5000))
+        base = alphabet[rng.integers(len(alphabet), size=length)]
+        for position in range(family_start, min(family_start + family_size, count)):
+            residues = base.copy()
+            if position > family_start:
+                substituted = rng.random(length) < family_divergence
+                residues[substituted] = alphabet[rng.integers(len(alphabet), size=substituted.sum())]
+            yield f"{position:05X}", residues.tobytes().decode()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("seqres", nargs="?", default=None,
+                        help="Optional path to pdb_seqres.txt, optionally gzip-compressed, used instead of synthetic "
+                             "chains.")
+    parser.add_argument("--sequences", type=int, default=40000, help="Number of synthetic chains.")
+    parser.add_argument("--queries", type=int, default=200, help="Number of queries.")
+    parser.add_argument("--substitution-rate", type=float, default=0.1, help="Fraction of substituted residues.")
+    parser.add_argument("--top-k", type=int, default=25, help="Number of PDB entries returned per query.")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    chains = synthetic_chains(args.sequences) if args.seqres is None else read_seqres(args.seqres)
+    index = build_similarity_index(chains)
+    print(f"Indexed {len(index.kmer_counts)} distinct sequences of {len(index.entries)} entries "
+          f"in {time.perf_counter() - start:.1f}s, {sum(array.nbytes for array in index) / 1024 ** 2:.1f} MiB")
+
+    rng = np.random.default_rng(0)
+    positions = rng.choice(len(index.kmer_counts), size=min(args.queries, len(index.kmer_counts)), replace=False)
+    queries = [(position, mutate(index_sequence(index, position), args.substitution_rate, rng))
+               for position in positions]
+
+    for refine in [False, True]:
+        times, hits = [], 0
+        for position, query in queries:
+            start = time.perf_counter()
+            structures = search_similar_sequences(index, query, args.top_k, refine=refine)
+            times.append(time.perf_counter() - start)
+            expected = {str(index.entries[entry])
+                        for entry in index.entry_indices[index.entry_indptr[position]:index.entry_indptr[position + 1]]}
+            hits += bool(structures) and structures[0][0] in expected
+        times = np.array(times) * 1000
+        print(f"{'refined' if refine else 'k-mer  '}: mean {times.mean():7.2f} ms  "
+              f"p95 {np.percentile(times, 95):7.2f} ms  max {times.max():7.2f} ms  "
+              f"top-1 accuracy {hits / len(queries):.1%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,51 @@
+import numpy as np
+import pandas as pd
+
+
+def build_class_count_cube(data: pd.DataFrame, prognostic_index: dict[tuple[str, str], np.ndarray],
+                           protein_class_vocabulary: list[str], protein_class_masks: np.ndarray) -> pd.DataFrame:
+    """
+    Count the proteins of every (cancer type, prognosis, chromosome, protein class) combination.
+    :param data: The prepared HPA DataFrame.
+    :param prognostic_index: The index built by build_prognostic_index.
+    :param protein_class_vocabulary: The protein class vocabulary.
+    :param protein_class_masks: The protein class masks of every row of data.
+    :return: A long-format DataFrame indexed by ("Cancer", "Prognosis") with "Chromosome", "Protein class" and
+    "Gene count" columns. Only non-zero counts are kept.
+    """
+    chromosome_codes, chromosomes = pd.factorize(data["Chromosome"])
+    class_bits = ((protein_class_masks[:, None] >> np.arange(len(protein_class_vocabulary))) & 1).astype(np.int32)
+
+    counts = []
+    for (cancer, prognosis), rows in prognostic_index.items():
+        # Sum the class membership of the proteins of each chromosome: a (chromosome x class) count matrix.
+        chromosome_counts = np.zeros((len(chromosomes), len(protein_class_vocabulary)), dtype=np.int32)
+        np.add.at(chromosome_counts, chromosome_codes[rows], class_bits[rows])
+        chromosome_index, class_index = np.nonzero(chromosome_counts)
+        counts.append(pd.DataFrame({
+            "Cancer": cancer,
+            "Prognosis": prognosis,
+            "Chromosome": chromosomes[chromosome_index],
+            "Protein class": np.array(protein_class_vocabulary, dtype=object)[class_index],
+            "Gene count": chromosome_counts[chromosome_index, class_index]
+        }))
+
+    columns = ["Cancer", "Prognosis", "Chromosome", "Protein class", "Gene count"]
+    cube = pd.concat(counts, ignore_index=True) if counts else pd.DataFrame(columns=columns)
+    return cube.set_index(["Cancer", "Prognosis"]).sort_index()
+
+
+def class_counts(class_count_cube: pd.DataFrame, cancer: str, prognosis: str,
+                 protein_selection: list[str]) -> pd.DataFrame:
+    """
+    Slice the protein counts per chromosome and protein class for a cancer type and prognosis.
+    :param class_count_cube: The cube built by build_class_count_cube.
+    :param cancer: The cancer type.
+    :param prognosis: One of "Favorable" or "Unfavorable".
+    :param protein_selection: The protein classes to keep.
+    :return: A DataFrame with "Chromosome", "Protein class" and "Gene count" columns.
+    """
+    if (cancer, prognosis) not in class_count_cube.index:
+        return pd.DataFrame(columns=["Chromosome", "Protein class", "Gene count"])
+    counts = class_count_cube.loc[[(cancer, prognosis)]].reset_index(drop=True)
+    return counts[counts["Protein class"].isin(protein_selection)]
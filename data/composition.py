@@ -0,0 +1,141 @@
+import argparse
+import os
+from typing import Iterable, NamedTuple, Optional
+
+import numpy as np
+import pandas as pd
+
+from data.sequence_store import SequenceStore, cache_directory
+from data.snapshot import read_snapshot, snapshot_directory
+
+# The 20 standard amino acids, in the order of the composition columns.
+amino_acids = list("ALIMVFWYNCQSTDERHKGP")
+amino_acid_bytes = np.array([ord(x) for x in amino_acids])
+
+# Stored next to the snapshot. Rows are keyed on UniProt accessions, so the file stays valid across HPA releases.
+composition_file = "composition.npz"
+
+
+class CompositionMatrix(NamedTuple):
+    """
+    Protein x amino acid residue counts, for the proteins with a locally stored sequence.
+    """
+    accessions: np.ndarray
+    counts: np.ndarray
+
+
+def sequence_composition(sequence: str) -> np.ndarray:
+    """
+    Count the standard amino acids of one sequence.
+    :param sequence: The sequence of amino acids as one-letter codes.
+    :return: An int array with the count of every amino acid in amino_acids.
+    """
+    residues = np.frombuffer(sequence.upper().encode("ascii", errors="replace"), dtype=np.uint8)
+    return np.bincount(residues, minlength=256)[amino_acid_bytes]
+
+
+def build_composition_matrix(accessions: Iterable[str], store: SequenceStore,
+                             batch_size: int = 4096) -> CompositionMatrix:
+    """
+    Count the amino acids of many proteins, with one bincount over the concatenated sequences of each batch.
+    :param accessions: UniProt accessions. Accessions without a stored sequence are skipped.
+    :param store: The sequence store.
+    :param batch_size: Number of sequences counted at once, which bounds the 256-column intermediate counts.
+    :return: The composition matrix.
+    """
+    found = [(accession, sequence) for accession in dict.fromkeys(accessions)
+             if (sequence := store.get(accession))]
+    counts = np.zeros((len(found), len(amino_acids)), dtype=np.int32)
+    for batch_start in range(0, len(found), batch_size):
+        batch = [sequence for _, sequence in found[batch_start:batch_start + batch_size]]
+        residues = np.frombuffer("".join(batch).upper().encode("ascii", errors="replace"), dtype=np.uint8)
+        proteins = np.repeat(np.arange(len(batch)), [len(sequence) for sequence in batch])
+        batch_counts = np.bincount(proteins * 256 + residues, minlength=len(batch) * 256).reshape(len(batch), 256)
+        counts[batch_start:batch_start + len(batch)] = batch_counts[:, amino_acid_bytes]
+    return CompositionMatrix(accessions=np.array([accession for accession, _ in found], dtype=str), counts=counts)
+
+
+def write_composition(matrix: CompositionMatrix, directory: str = snapshot_directory) -> str:
+    """
+    Write a composition matrix next to the snapshot.
+    :param matrix: The composition matrix.
+    :param directory: Directory containing the snapshot.
+    :return: The path of the written file.
+    """
+    path = os.path.join(directory, composition_file)
+    with open(f"{path}.tmp", "wb") as file:
+        np.savez_compressed(file, accessions=matrix.accessions, counts=matrix.counts)
+    os.replace(f"{path}.tmp", path)
+    return path
+
+
+def read_composition(directory: str = snapshot_directory) -> Optional[CompositionMatrix]:
+    """
+    Read the composition matrix stored next to the snapshot.
+    :param directory: Directory containing the snapshot.
+    :return: The composition matrix, or None if it was not built.
+    """
+    try:
+        with np.load(os.path.join(directory, composition_file)) as file:
+            return CompositionMatrix(accessions=file["accessions"], counts=file["counts"])
+    except (OSError, KeyError, ValueError):
+        return None
+
+
+def discard_composition(matrix: CompositionMatrix, accessions: Iterable[str]) -> CompositionMatrix:
+    """
+    Remove the counts of some proteins from a composition matrix, e.g. of proteins whose sequence changed.
+    :param matrix: The composition matrix.
+    :param accessions: UniProt accessions to remove.
+    :return: The composition matrix without these proteins.
+    """
+    kept = ~np.isin(matrix.accessions, list(accessions))
+    return CompositionMatrix(accessions=matrix.accessions[kept], counts=matrix.counts[kept])
+
+
+def align_composition(matrix: CompositionMatrix, accessions: pd.Series) -> np.ndarray:
+    """
+    Reorder a composition matrix to the rows of the HPA data.
+    :param matrix: The composition matrix.
+    :param accessions: The "Uniprot" column of the HPA data.
+    :return: An int array with one row of amino acid counts per row of the data, all zeros for proteins without
+    a stored sequence.
+    """
+    positions = pd.Index(matrix.accessions).get_indexer(accessions.to_numpy())
+    counts = np.zeros((len(accessions), len(amino_acids)), dtype=np.int32)
+    counts[positions >= 0] = matrix.counts[positions[positions >= 0]]
+    return counts
+
+
+def mean_composition(counts: np.ndarray) -> tuple[np.ndarray, int]:
+    """
+    Average the amino acid frequencies of a set of proteins, ignoring proteins without a sequence.
+    :param counts: Amino acid counts, one row per protein.
+    :return: The mean frequency of every amino acid in amino_acids, and the number of proteins averaged.
+    """
+    lengths = counts.sum(axis=1)
+    counts = counts[lengths > 0]
+    if len(counts) == 0:
+        return np.zeros(len(amino_acids)), 0
+    return (counts / lengths[lengths > 0][:, None]).mean(axis=0), len(counts)
+
+
+def main(argv: list[str] = None) -> None:
+    parser = argparse.ArgumentParser(
+        description="Count the amino acids of every stored protein sequence of the HPA snapshot."
+    )
+    parser.add_argument("--directory", default=snapshot_directory, help="Directory containing the snapshot.")
+    parser.add_argument("--store", default=os.path.join(cache_directory, "sequences"),
+                        help="Directory of the sequence store.")
+    args = parser.parse_args(argv)
+
+    data = read_snapshot(args.directory)
+    if data is None:
+        parser.error(f"No snapshot in {args.directory}, build one with `python -m data.snapshot` first.")
+    matrix = build_composition_matrix(data["Uniprot"], SequenceStore(args.store))
+    path = write_composition(matrix, args.directory)
+    print(f"Counted the amino acids of {len(matrix.accessions)} of {data['Uniprot'].nunique()} proteins to {path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+from dataclasses import dataclass
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+from data.aggregates import build_class_count_cube
+from data.composition import CompositionMatrix, align_composition
+from data.expression import ExpressionMatrix, build_expression_matrix, tpm_column_names
+from data.gene_search import GeneSearchIndex, build_gene_search_index
+from data.intervals import ChromosomeIntervals, build_density_bins, build_interval_index
+from data.prognostics import build_prognostic_index
+from data.protein_classes import build_protein_class_masks, build_protein_class_order, build_protein_class_vocabulary
+
+
+@dataclass(frozen=True)
+class HPADataset:
+    """
+    The prepared Human Protein Atlas DataFrame together with the indexes derived from it.
+    Row positions in the indexes refer to data, so both must always be replaced together. The expression columns
+    are dropped from data once parsed into the expression matrices. A single instance is shared by all sessions
+    and must not be modified.
+    """
+    data: pd.DataFrame
+    version: str
+    cancer_types: list[str]
+    prognostic_index: dict[tuple[str, str], np.ndarray]
+    protein_class_vocabulary: list[str]
+    protein_class_masks: np.ndarray
+    protein_class_order: np.ndarray
+    default_primary_protein_class: np.ndarray
+    class_count_cube: pd.DataFrame
+    interval_index: dict[str, ChromosomeIntervals]
+    density_bins: dict[int, np.ndarray]
+    expression: dict[str, ExpressionMatrix]
+    gene_search: GeneSearchIndex
+    composition: Optional[np.ndarray]
+
+
+def build_dataset(data: pd.DataFrame, composition: Optional[CompositionMatrix] = None) -> HPADataset:
+    """
+    Build the indexes for a prepared HPA DataFrame.
+    :param data: The DataFrame returned by prepare_data or read_snapshot. Its snapshot version is read from
+    data.attrs["version"].
+    :param composition: The amino acid composition matrix stored with the snapshot, if it was built.
+    :return: The dataset holding the DataFrame and its indexes.
+    """
+    prognostic_index = build_prognostic_index(data)
+    protein_class_vocabulary = build_protein_class_vocabulary(data["Protein class"])
+    protein_class_masks = build_protein_class_masks(data["Protein class"], protein_class_vocabulary)
+    return HPADataset(
+        data=data.drop(columns=list(tpm_column_names.values())),
+        version=data.attrs.get("version", "unversioned"),
+        cancer_types=data.attrs["cancer_types"],
+        prognostic_index=prognostic_index,
+        protein_class_vocabulary=protein_class_vocabulary,
+        protein_class_masks=protein_class_masks,
+        protein_class_order=build_protein_class_order(data["Protein class"], protein_class_vocabulary),
+        default_primary_protein_class=data["Default Protein Class"].to_numpy(dtype=object),
+        class_count_cube=build_class_count_cube(data, prognostic_index, protein_class_vocabulary, protein_class_masks),
+        interval_index=build_interval_index(data),
+        density_bins=build_density_bins(data),
+        expression={by: build_expression_matrix(data[column]) for by, column in tpm_column_names.items()},
+        gene_search=build_gene_search_index(data),
+        composition=align_composition(composition, data["Uniprot"]) if composition is not None else None
+    )
@@ -0,0 +1,202 @@
+import argparse
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import NamedTuple, Optional
+
+import numpy as np
+import pandas as pd
+
+from data.aggregates import class_counts
+from data.dataset import HPADataset, build_dataset
+from data.intervals import density_bin_sizes, gene_density
+from data.prognostics import prognostic_rows
+from data.protein_classes import has_protein_class, primary_protein_class, protein_class_selection_mask
+from data.preparation import hpa_url
+from data.snapshot import prepare_source, read_snapshot, snapshot_directory
+
+prognoses = ["Favorable", "Unfavorable"]
+# Chromosomes in display order. Chromosomes of the data missing here are exported after them.
+chromosome_order = [str(x) for x in range(1, 23)] + ["X", "Y"]
+# Number of gene rows of all cancer types and prognoses from which the export is split across processes. Below it,
+# starting the processes and sending them the data takes longer than the export itself.
+export_parallel_min_rows = 500_000
+
+
+class ExportArrays(NamedTuple):
+    """
+    The columns and indexes of a dataset needed to export the chromosome statistics, sent to the worker processes
+    instead of the whole dataset.
+    """
+    chromosomes: np.ndarray
+    density_bins: np.ndarray
+    protein_class_vocabulary: list[str]
+    protein_class_masks: np.ndarray
+    protein_class_order: np.ndarray
+    default_primary_protein_class: np.ndarray
+    genes: pd.DataFrame
+
+
+# The arrays of a worker process, set once by the pool initializer.
+worker_arrays: Optional[ExportArrays] = None
+
+
+def load_export_data(directory: str = snapshot_directory, source: str = hpa_url) -> pd.DataFrame:
+    """
+    Load the prepared HPA data like the app does: from the snapshot if there is one, or else from the source.
+    :param directory: Directory containing the snapshot.
+    :param source: Local path or URL of the proteinatlas.tsv file, used without a snapshot.
+    :return: The prepared HPA DataFrame.
+    """
+    data = read_snapshot(directory)
+    if data is None:
+        data, _ = prepare_source(source)
+    return data
+
+
+def export_arrays(dataset: HPADataset, bin_size: int) -> ExportArrays:
+    """
+    Gather the arrays of a dataset needed to export the chromosome statistics.
+    :param dataset: The HPA dataset.
+    :param bin_size: Bin size of the gene density, one of density_bin_sizes.
+    :return: The export arrays.
+    """
+    return ExportArrays(
+        chromosomes=dataset.data["Chromosome"].to_numpy(dtype=object),
+        density_bins=dataset.density_bins[bin_size],
+        protein_class_vocabulary=dataset.protein_class_vocabulary,
+        protein_class_masks=dataset.protein_class_masks,
+        protein_class_order=dataset.protein_class_order,
+        default_primary_protein_class=dataset.default_primary_protein_class,
+        genes=dataset.data[["Gene", "Ensembl", "Uniprot", "Start Position", "End Position"]]
+    )
+
+
+def initialize_worker(arrays: ExportArrays) -> None:
+    global worker_arrays
+    worker_arrays = arrays
+
+
+def export_cancer(arrays: ExportArrays, cancer: str, prognostic_rows: dict[str, np.ndarray], chromosomes: list[str],
+                  protein_selection: list[str], bin_size: int) -> tuple[pd.DataFrame, pd.DataFrame]:
+    """
+    Compute the chromosome view statistics of every prognosis and chromosome of one cancer type.
+    The proteins of each prognosis are filtered, assigned their primary class and counted once for all chromosomes.
+    :param arrays: The export arrays of the dataset.
+    :param cancer: The cancer type.
+    :param prognostic_rows: The sorted rows of the proteins with each prognosis of the cancer type.
+    :param chromosomes: The chromosomes, in export order.
+    :param protein_selection: The selected protein classes. All proteins are kept if empty.
+    :param bin_size: Bin size of the gene density, one of density_bin_sizes.
+    :return: The gene density per bin and primary protein class, and the filtered genes, of every prognosis and
+    chromosome.
+    """
+    selection_mask = protein_class_selection_mask(protein_selection, arrays.protein_class_vocabulary)
+    chromosome_names = np.array(chromosomes, dtype=object)
+    densities, genes = [], []
+    for prognosis, rows in prognostic_rows.items():
+        if protein_selection:
+            rows = rows[has_protein_class(arrays.protein_class_masks[rows], selection_mask)]
+        primary_protein_classes = primary_protein_class(
+            arrays.protein_class_masks[rows], selection_mask, arrays.protein_class_vocabulary,
+            arrays.default_primary_protein_class[rows], arrays.protein_class_order[rows]
+        )
+        ranks = pd.Index(chromosomes).get_indexer(arrays.chromosomes[rows])
+        order = np.argsort(ranks, kind="stable")
+        rows, ranks, primary_protein_classes = rows[order], ranks[order], primary_protein_classes[order]
+        cell = {"Cancer": cancer, "Prognosis": prognosis}
+
+        # The densities of all chromosomes are counted at once, on bins offset by chromosome.
+        bins = arrays.density_bins[rows].astype(np.int64)
+        stride = int(bins.max(initial=0)) + 1
+        density = gene_density(ranks * stride + bins, primary_protein_classes, bin_size)
+        chromosome_bins = density["Bin start"].to_numpy() // bin_size
+        densities.append(density.assign(**{"Bin start": chromosome_bins % stride * bin_size,
+                                           "Bin end": (chromosome_bins % stride + 1) * bin_size},
+                                        **cell, Chromosome=chromosome_names[chromosome_bins // stride]))
+        genes.append(arrays.genes.iloc[rows].assign(**{"Primary Protein Class": primary_protein_classes}, **cell,
+                                                    Chromosome=chromosome_names[ranks]))
+    return pd.concat(densities, ignore_index=True), pd.concat(genes, ignore_index=True)
+
+
+def export_cancer_in_worker(*args) -> tuple[pd.DataFrame, pd.DataFrame]:
+    return export_cancer(worker_arrays, *args)
+
+
+def export_statistics(dataset: HPADataset, output: str, protein_selection: list[str] = None,
+                      bin_size: int = 1_000_000, workers: Optional[int] = None) -> dict[str, str]:
+    """
+    Compute the cancer view and chromosome view statistics of every cancer type, prognosis and chromosome,
+    and write them as Parquet files. Cancer types are split across a process pool if the data is large enough.
+    :param dataset: The HPA dataset.
+    :param output: Directory to write the files to.
+    :param protein_selection: The protein classes to keep, or None or empty for all proteins.
+    :param bin_size: Bin size of the gene density, one of density_bin_sizes.
+    :param workers: Number of worker processes. Defaults to the number of CPUs.
+    :return: A dict mapping each table name to the path of its file.
+    """
+    protein_selection = protein_selection or []
+    chromosomes = [chromosome for chromosome in chromosome_order if chromosome in dataset.interval_index] + \
+        sorted(set(dataset.interval_index) - set(chromosome_order))
+    tasks = [(cancer, {prognosis: prognostic_rows(dataset.prognostic_index, cancer, prognosis)
+                       for prognosis in prognoses}, chromosomes, protein_selection, bin_size)
+             for cancer in dataset.cancer_types]
+
+    arrays = export_arrays(dataset, bin_size)
+    workers = min(workers or os.cpu_count(), len(tasks))
+    if workers > 1 and sum(len(rows) for task in tasks for rows in task[1].values()) >= export_parallel_min_rows:
+        with ProcessPoolExecutor(max_workers=workers, initializer=initialize_worker, initargs=(arrays,)) as pool:
+            results = list(pool.map(export_cancer_in_worker, *zip(*tasks)))
+    else:
+        results = [export_cancer(arrays, *task) for task in tasks]
+
+    # The cancer view counts are slices of the precomputed cube, too cheap to distribute.
+    classes = protein_selection or dataset.protein_class_vocabulary
+    cancer_statistics = pd.concat([
+        class_counts(dataset.class_count_cube, cancer, prognosis, classes).assign(Cancer=cancer, Prognosis=prognosis)
+        for cancer in dataset.cancer_types for prognosis in prognoses
+    ], ignore_index=True)
+
+    tables = {
+        "cancer_statistics": cancer_statistics,
+        "chromosome_density": pd.concat([density for density, _ in results], ignore_index=True),
+        "chromosome_genes": pd.concat([genes for _, genes in results], ignore_index=True)
+    }
+    os.makedirs(output, exist_ok=True)
+    paths = {}
+    for name, table in tables.items():
+        leading = ["Cancer", "Prognosis", "Chromosome"]
+        table = table[leading + [column for column in table.columns if column not in leading]]
+        paths[name] = os.path.join(output, f"{name}.parquet")
+        table.astype({"Cancer": "category", "Prognosis": "category", "Chromosome": "category"}) \
+            .to_parquet(paths[name], index=False)
+    return paths
+
+
+def main(argv: list[str] = None) -> None:
+    parser = argparse.ArgumentParser(
+        description="Export the cancer and chromosome view statistics of every cancer type, prognosis and chromosome."
+    )
+    parser.add_argument("--output", default="export", help="Directory to write the Parquet files to.")
+    parser.add_argument("--directory", default=snapshot_directory, help="Directory containing the snapshot.")
+    parser.add_argument("--source", default=hpa_url,
+                        help="Local path or URL of the proteinatlas.tsv(.zip) file, used if there is no snapshot.")
+    parser.add_argument("--protein-classes", nargs="*", default=[],
+                        help="Protein classes to keep. Defaults to all proteins.")
+    parser.add_argument("--bin-size", type=int, default=1_000_000, choices=density_bin_sizes,
+                        help="Bin size of the gene density, in base pairs.")
+    parser.add_argument("--workers", type=int, default=None, help="Number of worker processes. Defaults to all CPUs.")
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    dataset = build_dataset(load_export_data(args.directory, args.source))
+    loaded = time.perf_counter()
+    paths = export_statistics(dataset, args.output, args.protein_classes, args.bin_size, args.workers)
+    print(f"Loaded {len(dataset.data)} genes in {loaded - start:.1f}s, "
+          f"exported in {time.perf_counter() - loaded:.1f}s:")
+    for path in paths.values():
+        print(f"  {path}")
+
+
+if __name__ == "__main__":
+    main()
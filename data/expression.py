@@ -0,0 +1,94 @@
+from typing import NamedTuple, Optional
+
+import numpy as np
+import pandas as pd
+
+tpm_column_names = {
+    "cell": "RNA single cell type specific nTPM",
+    "tissue": "RNA tissue specific nTPM"
+}
+
+
+class ExpressionMatrix(NamedTuple):
+    """
+    A sparse gene x label (cell type or tissue) RNA expression matrix in compressed sparse row format.
+    The values of row i are values[indptr[i]:indptr[i + 1]], for the labels at the same positions of indices.
+    """
+    indptr: np.ndarray
+    indices: np.ndarray
+    values: np.ndarray
+    labels: np.ndarray
+
+
+def build_expression_matrix(tpm: pd.Series) -> ExpressionMatrix:
+    """
+    Parse an HPA nTPM column, with values such as "t-cells: 12.3;b-cells: 4.5", into a sparse matrix.
+    :param tpm: The "RNA single cell type specific nTPM" or "RNA tissue specific nTPM" column.
+    :return: The expression matrix, with one row per row of tpm and labels in title case.
+    """
+    entries = pd.Series(tpm.to_numpy(), dtype="string").str.split(";").explode().dropna()
+    entries = entries.str.split(":", n=1, expand=True)
+    if entries.empty:
+        entries = pd.DataFrame({0: pd.Series(dtype=object), 1: pd.Series(dtype=object)})
+    entries = pd.DataFrame({
+        "row": entries.index.to_numpy(),
+        "label": entries[0].str.strip().str.title(),
+        "value": entries[1].str.strip().astype(float)
+    }).drop_duplicates(subset=["row", "label"], keep="last")
+
+    indices, labels = pd.factorize(entries["label"], sort=True)
+    return ExpressionMatrix(
+        indptr=np.concatenate([[0], np.bincount(entries["row"], minlength=len(tpm)).cumsum()]).astype(np.int64),
+        indices=indices.astype(np.int32),
+        values=entries["value"].to_numpy(dtype=np.float32),
+        labels=np.asarray(labels, dtype=object)
+    )
+
+
+def expression_strings(matrix: ExpressionMatrix) -> pd.Series:
+    """
+    Format every row of an expression matrix as one string, such as "B-Cells: 4.5;T-Cells: 12.3", to compare the
+    expression of genes between datasets.
+    :param matrix: The expression matrix.
+    :return: A Series of strings with one value per row of the matrix, empty for rows without expression data.
+    """
+    rows = np.repeat(np.arange(len(matrix.indptr) - 1), np.diff(matrix.indptr))
+    entries = pd.Series(matrix.labels[matrix.indices] + ": " + matrix.values.astype(str).astype(object), index=rows)
+    return entries.groupby(level=0).agg(";".join).reindex(np.arange(len(matrix.indptr) - 1), fill_value="")
+
+
+def expression_row(matrix: ExpressionMatrix, row: int, by: str) -> Optional[pd.DataFrame]:
+    """
+    Get the expression values of one gene.
+    :param matrix: The expression matrix.
+    :param row: Integer row position of the gene.
+    :param by: Name of the label column, one of {"cell", "tissue"}.
+    :return: A DataFrame with the label and "TPM" columns, or None if no information is available.
+    """
+    start, end = matrix.indptr[row], matrix.indptr[row + 1]
+    if start == end:
+        return None
+    return pd.DataFrame({by: matrix.labels[matrix.indices[start:end]], "TPM": matrix.values[start:end]})
+
+
+def top_expressed_genes(matrix: ExpressionMatrix, label: str, rows: np.ndarray, n: int = 10) -> pd.DataFrame:
+    """
+    Find the genes with the highest expression in a cell type or tissue among a subset of genes.
+    :param matrix: The expression matrix.
+    :param label: The cell type or tissue, in title case.
+    :param rows: Integer row positions of the genes to consider, e.g. the genes of the current filter.
+    :param n: Number of genes to return.
+    :return: A DataFrame with "row" and "TPM" columns, sorted by decreasing expression.
+    """
+    matches = np.flatnonzero(matrix.labels == label)
+    if len(matches) == 0 or len(rows) == 0:
+        return pd.DataFrame({"row": pd.Series(dtype=np.int64), "TPM": pd.Series(dtype=np.float32)})
+    # Gather the entry positions of all selected rows at once, then keep those of the requested label.
+    starts = matrix.indptr[rows]
+    lengths = matrix.indptr[rows + 1] - starts
+    entries = np.arange(lengths.sum()) + np.repeat(starts - (np.cumsum(lengths) - lengths), lengths)
+    entry_rows = np.repeat(rows, lengths)
+    selected = matrix.indices[entries] == matches[0]
+    entries, entry_rows = entries[selected], entry_rows[selected]
+    order = np.argsort(-matrix.values[entries], kind="stable")[:n]
+    return pd.DataFrame({"row": entry_rows[order], "TPM": matrix.values[entries][order]})
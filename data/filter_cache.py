@@ -0,0 +1,109 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Hashable, Iterable, Optional
+
+# Default bounds of the filter cache. The filter space is small, so most entries are reused across sessions.
+filter_cache_entries = 256
+filter_cache_ttl = None
+
+
+def filter_key(view: str, cancer: str, prognosis: str, protein_selection: Iterable[str], *extra: Hashable) -> tuple:
+    """
+    Build a normalized cache key for a filter, so that equivalent selections share an entry.
+    :param view: Name of the cached result, e.g. the view computing it.
+    :param cancer: The cancer type.
+    :param prognosis: One of "Favorable" or "Unfavorable".
+    :param protein_selection: The selected protein classes, in any order.
+    :param extra: Further hashable parameters of the result, e.g. a chromosomal region.
+    :return: The cache key.
+    """
+    return (view, cancer, prognosis, tuple(sorted(set(protein_selection)))) + extra
+
+
+class FilterCache:
+    """
+    Process-wide LRU cache of filter results and derived chart data, shared by all sessions.
+    Entries belong to a dataset version: looking up a new version clears the cache, so results never outlive the
+    snapshot they were computed from, while lookups for a retired version are computed without being cached.
+    Cached values are shared and must not be modified.
+    """
+
+    def __init__(self, max_entries: int = filter_cache_entries, ttl: Optional[float] = filter_cache_ttl):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.version = None
+        self._retired_versions: set[str] = set()
+        self._entries: OrderedDict[tuple, tuple[float, Any]] = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, version: str, key: tuple, compute: Callable[[], Any]) -> Any:
+        """
+        Look up a filter result, computing and caching it on a miss.
+        :param version: Version of the dataset the result is computed from.
+        :param key: The normalized key, as built by filter_key.
+        :param compute: Function computing the result on a miss. Called without holding the lock.
+        :return: The cached or computed result.
+        """
+        with self._lock:
+            retired = version in self._retired_versions
+            if not retired:
+                if version != self.version:
+                    self._switch_version(version)
+                entry = self._entries.get(key)
+                if entry is not None and (self.ttl is None or time.monotonic() - entry[0] < self.ttl):
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return entry[1]
+            self.misses += 1
+
+        value = compute()
+
+        with self._lock:
+            if version == self.version:
+                self._entries[key] = (time.monotonic(), value)
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+        return value
+
+    def _switch_version(self, version: str) -> None:
+        """
+        Make a version current, dropping all entries. Requires the lock.
+        """
+        if self.version is not None and self.version != version:
+            self._retired_versions.add(self.version)
+        self._retired_versions.discard(version)
+        self._entries.clear()
+        self.version = version
+
+    def migrate(self, version: str, keep: Callable[[tuple], bool]) -> int:
+        """
+        Make a new dataset version current, keeping the entries that are unaffected by the changes.
+        :param version: The new dataset version.
+        :param keep: Predicate on cache keys, True for entries whose result is the same in the new version.
+        :return: The number of entries kept.
+        """
+        with self._lock:
+            kept = [(key, entry) for key, entry in self._entries.items() if keep(key)]
+            self._switch_version(version)
+            self._entries.update(kept)
+            return len(kept)
+
+    def clear(self) -> None:
+        """
+        Drop all cached results.
+        :return: None.
+        """
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict[str, int]:
+        """
+        Get the cache counters.
+        :return: The hit and miss counts and the number of entries.
+        """
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "entries": len(self._entries)}
@@ -0,0 +1,48 @@
+import numpy as np
+
+from data.dataset import HPADataset
+from data.intervals import overlapping_rows
+from data.prognostics import prognostic_rows
+from data.protein_classes import has_protein_class, primary_protein_class, protein_class_selection_mask
+
+
+def filtered_proteins(dataset: HPADataset, cancer: str, prognosis: str, protein_selection: list[str]) -> np.ndarray:
+    """
+    Filter the proteins with a given prognostic and protein classes, as in the cancer view.
+    :param dataset: The HPA dataset.
+    :param cancer: The cancer type.
+    :param prognosis: One of "Favorable" or "Unfavorable".
+    :param protein_selection: The selected protein classes. All proteins are kept if empty.
+    :return: The sorted integer row positions of the proteins.
+    """
+    rows = prognostic_rows(dataset.prognostic_index, cancer, prognosis)
+    if protein_selection:
+        selection_mask = protein_class_selection_mask(protein_selection, dataset.protein_class_vocabulary)
+        rows = rows[has_protein_class(dataset.protein_class_masks[rows], selection_mask)]
+    return rows
+
+
+def region_proteins(dataset: HPADataset, cancer: str, prognosis: str, protein_selection: list[str],
+                    chromosome: str, start: int, end: int) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Filter the proteins of a chromosomal region with a given prognostic, as in the chromosome view.
+    :param dataset: The HPA dataset.
+    :param cancer: The cancer type.
+    :param prognosis: One of "Favorable" or "Unfavorable".
+    :param protein_selection: The selected protein classes. All proteins are kept if empty.
+    :param chromosome: The chromosome.
+    :param start: First position of the region.
+    :param end: Position right after the end of the region.
+    :return: The sorted integer row positions of the proteins, and their primary protein classes.
+    """
+    rows = prognostic_rows(dataset.prognostic_index, cancer, prognosis)
+    rows = np.intersect1d(rows, overlapping_rows(dataset.interval_index, chromosome, start, end), assume_unique=True)
+
+    selection_mask = protein_class_selection_mask(protein_selection, dataset.protein_class_vocabulary)
+    if protein_selection:
+        rows = rows[has_protein_class(dataset.protein_class_masks[rows], selection_mask)]
+    primary_protein_classes = primary_protein_class(
+        dataset.protein_class_masks[rows], selection_mask, dataset.protein_class_vocabulary,
+        dataset.default_primary_protein_class[rows], dataset.protein_class_order[rows]
+    )
+    return rows, primary_protein_classes
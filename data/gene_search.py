@@ -0,0 +1,128 @@
+from bisect import bisect_left
+from typing import NamedTuple, Optional
+
+import numpy as np
+import pandas as pd
+
+
+class GeneSearchIndex(NamedTuple):
+    """
+    Lookup tables from gene symbols, gene synonyms and UniProt IDs to row positions, plus a sorted name list for
+    prefix search and a trigram index for fuzzy search. Names are stored in upper case.
+    """
+    gene_rows: dict[str, int]
+    synonym_rows: dict[str, list[int]]
+    uniprot_rows: dict[str, int]
+    names: list[str]
+    name_rows: np.ndarray
+    name_is_synonym: np.ndarray
+    trigrams: dict[str, np.ndarray]
+
+
+def name_trigrams(name: str) -> set[str]:
+    """
+    Get the trigrams of a name, padded so that short names and name starts still produce trigrams.
+    :param name: An upper case name.
+    :return: The set of trigrams.
+    """
+    padded = f"  {name} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def build_gene_search_index(data: pd.DataFrame) -> GeneSearchIndex:
+    """
+    Build the gene search index of the HPA DataFrame.
+    :param data: The prepared HPA DataFrame.
+    :return: The search index. Where a name occurs in several rows, the exact lookups return the first one.
+    """
+    gene_rows, synonym_rows, uniprot_rows = {}, {}, {}
+    entries = []
+    for row, (gene, synonyms, uniprot_id) in enumerate(zip(data["Gene"], data["Gene synonym"], data["Uniprot"])):
+        gene = str(gene).upper()
+        gene_rows.setdefault(gene, row)
+        uniprot_rows.setdefault(uniprot_id, row)
+        entries.append((gene, row, False))
+        if not pd.isna(synonyms):
+            for synonym in {synonym.strip().upper() for synonym in synonyms.split(",")} - {"", gene}:
+                synonym_rows.setdefault(synonym, []).append(row)
+                entries.append((synonym, row, True))
+    entries.sort()
+
+    trigram_names = {}
+    for position, (name, _, _) in enumerate(entries):
+        for trigram in name_trigrams(name):
+            trigram_names.setdefault(trigram, []).append(position)
+
+    return GeneSearchIndex(
+        gene_rows=gene_rows,
+        synonym_rows=synonym_rows,
+        uniprot_rows=uniprot_rows,
+        names=[name for name, _, _ in entries],
+        name_rows=np.array([row for _, row, _ in entries], dtype=np.int64),
+        name_is_synonym=np.array([is_synonym for _, _, is_synonym in entries], dtype=bool),
+        trigrams={trigram: np.array(positions, dtype=np.int64) for trigram, positions in trigram_names.items()}
+    )
+
+
+def gene_row(index: GeneSearchIndex, gene: str) -> Optional[int]:
+    """
+    Find the row of a gene by symbol, or else by synonym.
+    :param index: The gene search index.
+    :param gene: The gene symbol or synonym, in any case.
+    :return: The row position, or None if the gene is unknown.
+    """
+    gene = gene.strip().upper()
+    if gene in index.gene_rows:
+        return index.gene_rows[gene]
+    rows = index.synonym_rows.get(gene)
+    return rows[0] if rows else None
+
+
+def uniprot_row(index: GeneSearchIndex, uniprot_id: str) -> Optional[int]:
+    """
+    Find the row of a protein by UniProt ID.
+    :param index: The gene search index.
+    :param uniprot_id: The UniProt ID, as written in the HPA "Uniprot" column.
+    :return: The row position, or None if the ID is unknown.
+    """
+    return index.uniprot_rows.get(uniprot_id)
+
+
+def search_genes(index: GeneSearchIndex, query: str, limit: int = 20) -> list[int]:
+    """
+    Get a ranked list of genes matching a partial query, for typeahead selection.
+    Exact gene symbol, synonym and UniProt ID matches rank first, then names starting with the query (symbols before
+    synonyms, shorter names first), then names sharing the most trigrams with the query.
+    :param index: The gene search index.
+    :param query: The text typed so far. An empty query returns the first genes of the data.
+    :param limit: Maximum number of genes to return.
+    :return: The row positions of the matching genes, best match first and without duplicates.
+    """
+    query = query.strip().upper()
+    if not query:
+        return list(dict.fromkeys(index.gene_rows.values()))[:limit]
+
+    ranked = []
+    for row in [index.gene_rows.get(query), index.uniprot_rows.get(query)] + index.synonym_rows.get(query, []):
+        if row is not None:
+            ranked.append(row)
+
+    start = bisect_left(index.names, query)
+    end = bisect_left(index.names, query + "\uffff", lo=start)
+    if start < end:
+        lengths = np.fromiter((len(name) for name in index.names[start:end]), dtype=np.int64, count=end - start)
+        order = np.lexsort((lengths, index.name_is_synonym[start:end]))
+        ranked.extend(index.name_rows[start:end][order].tolist())
+
+    if len(dict.fromkeys(ranked)) < limit:
+        query_trigrams = [trigram for trigram in name_trigrams(query) if trigram in index.trigrams]
+        if query_trigrams:
+            positions = np.concatenate([index.trigrams[trigram] for trigram in query_trigrams])
+            shared = np.bincount(positions, minlength=len(index.names))
+            candidates = np.flatnonzero(shared)
+            # Rank by the share of the query trigrams found, requiring at least a third of them.
+            candidates = candidates[shared[candidates] * 3 >= len(name_trigrams(query))]
+            order = np.argsort(-shared[candidates], kind="stable")[:limit * 4]
+            ranked.extend(index.name_rows[candidates[order]].tolist())
+
+    return list(dict.fromkeys(ranked))[:limit]
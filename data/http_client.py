@@ -0,0 +1,91 @@
+import threading
+from concurrent.futures import Future
+from typing import Optional, Union
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# Default timeout in seconds of a request, or (connect, read) timeouts.
+http_timeout = (5, 30)
+# Retries of failed connections and of responses with a retryable status, with exponential backoff.
+http_retries = 3
+http_backoff = 0.5
+http_retry_statuses = (429, 500, 502, 503, 504)
+# Maximum number of concurrent requests to one host, and number of kept-alive connections per host.
+http_host_concurrency = 4
+http_pool_size = 16
+
+
+class HTTPClient:
+    """
+    HTTP client shared by all sessions of a process.
+    Requests go through one pooled keep-alive session that retries with backoff, at most host_concurrency at a time
+    per host. Concurrent identical requests are coalesced: the first one is sent, and the others wait for its response.
+    """
+
+    def __init__(self, timeout: Union[float, tuple[float, float]] = http_timeout, retries: int = http_retries,
+                 backoff: float = http_backoff, host_concurrency: int = http_host_concurrency,
+                 pool_size: int = http_pool_size):
+        self.timeout = timeout
+        self.host_concurrency = host_concurrency
+        self.session = requests.Session()
+        retry = Retry(total=retries, backoff_factor=backoff, status_forcelist=http_retry_statuses,
+                      allowed_methods=frozenset({"GET", "HEAD"}), raise_on_status=False)
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+        self._host_slots: dict[str, threading.BoundedSemaphore] = {}
+        self._in_flight: dict[tuple, Future] = {}
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.coalesced = 0
+
+    def _host_slot(self, url: str) -> threading.BoundedSemaphore:
+        host = urlsplit(url).netloc
+        with self._lock:
+            if host not in self._host_slots:
+                self._host_slots[host] = threading.BoundedSemaphore(self.host_concurrency)
+            return self._host_slots[host]
+
+    def get(self, url: str, params: Optional[dict] = None, headers: Optional[dict] = None,
+            timeout: Union[float, tuple[float, float], None] = None) -> requests.Response:
+        """
+        Send a GET request, or wait for the response of an identical request in flight.
+        The response body is read before the response is returned, so it can be shared between sessions.
+        :param url: The URL.
+        :param params: Optional query parameters.
+        :param headers: Optional request headers.
+        :param timeout: Timeout in seconds, or (connect, read) timeouts. Defaults to the timeout of the client.
+        :return: The response. Its status is not checked.
+        :raises requests.RequestException: If the request failed after all retries.
+        """
+        key = (url, tuple(sorted((params or {}).items())), tuple(sorted((headers or {}).items())))
+        with self._lock:
+            flight = self._in_flight.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._in_flight[key] = Future()
+                self.requests += 1
+            else:
+                self.coalesced += 1
+        if not leader:
+            return flight.result()
+
+        try:
+            with self._host_slot(url):
+                response = self.session.get(url, params=params, headers=headers, timeout=timeout or self.timeout)
+            flight.set_result(response)
+            return response
+        except BaseException as error:
+            flight.set_exception(error)
+            raise
+        finally:
+            with self._lock:
+                del self._in_flight[key]
+
+
+# The client of this process, used for all requests to UniProt, the PDB and the Human Protein Atlas.
+http_client = HTTPClient()
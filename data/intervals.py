@@ -0,0 +1,114 @@
+from typing import NamedTuple
+
+import numpy as np
+import pandas as pd
+
+
+class ChromosomeIntervals(NamedTuple):
+    """
+    The gene intervals of one chromosome, sorted by start position.
+    """
+    starts: np.ndarray
+    ends: np.ndarray
+    rows: np.ndarray
+    max_length: int
+
+
+def build_interval_index(data: pd.DataFrame) -> dict[str, ChromosomeIntervals]:
+    """
+    Build a sorted interval index of gene positions for every chromosome.
+    :param data: The prepared HPA DataFrame, containing integer "Start Position" and "End Position" columns.
+    :return: A dict mapping each chromosome to its gene intervals. Rows are integer row positions in data.
+    """
+    starts = data["Start Position"].to_numpy()
+    ends = data["End Position"].to_numpy()
+    index = {}
+    for chromosome, rows in data.groupby("Chromosome", sort=False, observed=True).indices.items():
+        rows = rows[np.argsort(starts[rows], kind="stable")]
+        index[chromosome] = ChromosomeIntervals(
+            starts=starts[rows],
+            ends=ends[rows],
+            rows=rows,
+            max_length=int((ends[rows] - starts[rows]).max(initial=0))
+        )
+    return index
+
+
+def overlapping_rows(interval_index: dict[str, ChromosomeIntervals], chromosome: str,
+                     start: int, end: int) -> np.ndarray:
+    """
+    Find the genes overlapping the region [start, end) of a chromosome.
+    :param interval_index: The index built by build_interval_index.
+    :param chromosome: The chromosome to search.
+    :param start: First position of the region.
+    :param end: Position right after the end of the region.
+    :return: The integer row positions of the overlapping genes, sorted by start position.
+    """
+    if chromosome not in interval_index:
+        return np.empty(0, dtype=np.int64)
+    intervals = interval_index[chromosome]
+    # Genes starting before start - max_length cannot reach the region, so only a contiguous slice is checked.
+    first = np.searchsorted(intervals.starts, start - intervals.max_length, side="left")
+    last = np.searchsorted(intervals.starts, end, side="left")
+    overlapping = intervals.ends[first:last] >= start
+    return intervals.rows[first:last][overlapping]
+
+
+def chromosome_extent(interval_index: dict[str, ChromosomeIntervals], chromosome: str) -> int:
+    """
+    Get the last gene position of a chromosome.
+    :param interval_index: The index built by build_interval_index.
+    :param chromosome: The chromosome.
+    :return: The largest end position of the genes in the chromosome, or 0 if it has no genes.
+    """
+    if chromosome not in interval_index:
+        return 0
+    return int(interval_index[chromosome].ends.max(initial=0))
+
+
+# Bin sizes of the gene density tracks, from finest to coarsest.
+density_bin_sizes = [100_000, 500_000, 1_000_000, 5_000_000]
+
+
+def build_density_bins(data: pd.DataFrame) -> dict[int, np.ndarray]:
+    """
+    Precompute the density bin of every gene at every bin size.
+    :param data: The prepared HPA DataFrame, containing an integer "Start Position" column.
+    :return: A dict mapping each bin size in density_bin_sizes to the bin index of every row of data.
+    """
+    starts = data["Start Position"].to_numpy()
+    return {bin_size: (starts // bin_size).astype(np.int32) for bin_size in density_bin_sizes}
+
+
+def density_bin_size(start: int, end: int, max_bins: int = 300) -> int:
+    """
+    Choose the finest bin size that covers a region with at most max_bins bins.
+    :param start: First position of the region.
+    :param end: Position right after the end of the region.
+    :param max_bins: Maximum number of bins to display.
+    :return: One of density_bin_sizes.
+    """
+    for bin_size in density_bin_sizes:
+        if (end - start) / bin_size <= max_bins:
+            return bin_size
+    return density_bin_sizes[-1]
+
+
+def gene_density(bins: np.ndarray, protein_classes: np.ndarray, bin_size: int) -> pd.DataFrame:
+    """
+    Count genes per density bin and protein class.
+    :param bins: The density bin of each gene, as precomputed by build_density_bins for bin_size.
+    :param protein_classes: The protein class of each gene.
+    :param bin_size: The bin size in base pairs.
+    :return: A DataFrame with "Bin start", "Bin end", "Primary Protein Class" and "Gene count" columns,
+    containing only non-empty bins.
+    """
+    class_codes, classes = pd.factorize(protein_classes)
+    keys, counts = np.unique(bins.astype(np.int64) * max(len(classes), 1) + class_codes, return_counts=True)
+    bin_index, class_index = np.divmod(keys, max(len(classes), 1))
+    return pd.DataFrame({
+        "Bin start": bin_index * bin_size,
+        "Bin end": (bin_index + 1) * bin_size,
+        "Primary Protein Class": np.asarray(classes, dtype=object)[class_index],
+        "Gene count": counts
+    })
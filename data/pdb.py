@@ -0,0 +1,89 @@
+from typing import NamedTuple
+
+import numpy as np
+
+# Atoms kept in cartoon mode. 3Dmol.js draws protein cartoons from the backbone only.
+backbone_atom_names = {b"N", b"CA", b"C", b"O", b"OXT"}
+nucleotide_residue_names = {b"A", b"C", b"G", b"U", b"DA", b"DC", b"DG", b"DT", b"DU"}
+solvent_residue_names = {b"HOH", b"WAT", b"H2O", b"DOD", b"SOL"}
+
+
+class ParsedStructure(NamedTuple):
+    """
+    The coordinate records of the first model of a PDB file, as fixed-width arrays.
+    """
+    secondary_structure: list[bytes]
+    connections: list[bytes]
+    atoms: np.ndarray
+    atom_names: np.ndarray
+    residue_names: np.ndarray
+
+
+def parse_pdb(structure: str) -> ParsedStructure:
+    """
+    Parse the records of a PDB file needed for display.
+    Only the first model is kept, since 3Dmol.js only displays the first model of multi-model files.
+    :param structure: The structure in PDB format.
+    :return: The parsed structure.
+    """
+    secondary_structure, connections, atoms = [], [], []
+    first_model = True
+    for line in structure.encode().splitlines():
+        record = line[:6]
+        if record in (b"ATOM  ", b"HETATM"):
+            if first_model:
+                atoms.append(line)
+        elif record in (b"HELIX ", b"SHEET "):
+            secondary_structure.append(line)
+        elif record == b"CONECT":
+            connections.append(line)
+        elif record == b"ENDMDL":
+            first_model = False
+
+    atoms = np.array(atoms, dtype="S80")
+    return ParsedStructure(
+        secondary_structure=secondary_structure,
+        connections=connections,
+        atoms=atoms,
+        atom_names=record_columns(atoms, 12, 16),
+        residue_names=record_columns(atoms, 17, 20)
+    )
+
+
+def record_columns(records: np.ndarray, start: int, end: int) -> np.ndarray:
+    """
+    Extract a fixed-width field from every record.
+    :param records: An array of 80-byte PDB records.
+    :param start: 0-based first column of the field.
+    :param end: 0-based column right after the field.
+    :return: A bytes array with the stripped field values.
+    """
+    columns = records.view("S1").reshape(len(records), 80)[:, start:end].copy()
+    return np.char.strip(columns.view(f"S{end - start}").ravel())
+
+
+def reduce_structure(structure: ParsedStructure, visualization_type: str, show_solvent: bool = False) -> str:
+    """
+    Build the smallest PDB file that displays the same as the full structure in a given style.
+    :param structure: The parsed structure.
+    :param visualization_type: One of {"cartoon", "stick", "sphere"}. Cartoons only keep backbone atoms of amino acids
+    and all atoms of nucleotides, the other styles keep every atom.
+    :param show_solvent: Whether to keep solvent molecules. Always False for cartoons, which do not display them.
+    :return: The reduced structure in PDB format.
+    """
+    if visualization_type == "cartoon":
+        keep = np.isin(structure.atom_names, list(backbone_atom_names)) | \
+               np.isin(structure.residue_names, list(nucleotide_residue_names))
+        keep &= ~np.isin(structure.residue_names, list(solvent_residue_names))
+        records = structure.secondary_structure + list(structure.atoms[keep])
+    else:
+        keep = np.ones(len(structure.atoms), dtype=bool)
+        if not show_solvent:
+            keep &= ~np.isin(structure.residue_names, list(solvent_residue_names))
+        # Bonds to removed atoms would point at atoms missing from the reduced file.
+        serials = set(record_columns(structure.atoms[keep], 6, 11))
+        connections = [line for line in structure.connections
+                       if all(line[i:i + 5].strip() in serials for i in range(6, min(len(line), 31), 5)
+                              if line[i:i + 5].strip())]
+        records = structure.secondary_structure + list(structure.atoms[keep]) + connections
+    return b"\n".join(records + [b"END"]).decode()
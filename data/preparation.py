@@ -0,0 +1,102 @@
+import numpy as np
+import pandas as pd
+
+from data.prognostics import cancer_type, generate_prognostics, prognostic_columns
+
+hpa_url = "https://www.proteinatlas.org/download/proteinatlas.tsv.zip"
+
+# Columns kept in memory, out of the hundreds of columns of the HPA file. Everything else is dropped once
+# the derived columns are computed. Low-cardinality columns are stored as categoricals and text as Arrow strings.
+text_columns = ["Gene", "Gene synonym", "Ensembl", "Gene description", "Uniprot", "Biological process",
+                "Molecular function", "Disease involvement", "RNA single cell type specific nTPM",
+                "RNA tissue specific nTPM"]
+categorical_columns = ["Chromosome", "Protein class", "Favorable prognostics", "Unfavorable prognostics",
+                       "Default Protein Class"]
+position_columns = ["Start Position", "End Position"]
+
+# Prioritized list of protein classes.
+# Proteins that belong to multiple classes will have
+# their "primary protein class" be the one that appears closest to the top of the list.
+protein_class_priority = [
+    "Enzymes",
+    "Transporters",
+    "Transcription factors",
+    "Plasma proteins",
+    "Ribosomal proteins",
+    "Metabolic proteins",
+    "G-protein coupled receptors",
+    "Voltage-gated ion channels",
+    "Immunoglobulin genes",
+    "T-cell receptor genes",
+    "Nuclear receptors",
+    "Disease related genes",
+    "Human disease related genes",
+    "Cancer-related genes",
+    "Potential drug targets",
+    "FDA approved drug targets",
+    "RAS pathway related proteins",
+    "CD markers",
+    "Candidate cardiovascular disease genes",
+    "Blood group antigen proteins",
+    "RNA polymerase related proteins",
+    "Citric acid cycle related proteins",
+    "Predicted intracellular proteins",
+    "Predicted membrane proteins",
+    "Predicted secreted proteins"
+]
+
+
+def prioritize_protein_class(protein_classes: str, priority_list: list[str] = None) -> list[str]:
+    """
+    Get a list of prioritized protein classes from a comma-separated string of protein classes.
+    :param protein_classes: Protein classes in a comma-separated format.
+    :param priority_list: list of prioritized protein classes.
+    :return: The primary protein class as a string.
+    """
+
+    if priority_list is None:
+        priority_list = protein_class_priority
+
+    class_list = [x.strip() for x in protein_classes.split(",")]
+    prioritized_protein_classes = [x for x in priority_list if x in class_list]
+    if prioritized_protein_classes:
+        return prioritized_protein_classes
+    return class_list
+
+
+def prepare_data(data: pd.DataFrame) -> pd.DataFrame:
+    """
+    Compute the derived columns used by the views from a raw Human Protein Atlas (HPA) DataFrame.
+    :param data: The HPA DataFrame as read from the proteinatlas.tsv file.
+    :return: the tidy DataFrame containing HPA data, with the cancer types of the prognostics columns
+    in data.attrs["cancer_types"].
+    """
+    cancer_types = [cancer_type(column) for column in prognostic_columns(data.columns)]
+    data["Favorable prognostics"] = generate_prognostics(data, prognostic_type="favorable")
+    data["Unfavorable prognostics"] = generate_prognostics(data, prognostic_type="unfavorable")
+    data.dropna(subset=["Uniprot"], inplace=True)
+    data["Default Protein Class"] = data["Protein class"].apply(lambda x: prioritize_protein_class(x)[0])
+    data.drop(data[(data["Chromosome"] == "MT") | (data["Chromosome"] == "Unmapped")].index, inplace=True)
+    positions = data["Position"].str.split("-", n=1, expand=True)
+    data["Start Position"] = positions[0].str.strip().astype(np.int64)
+    data["End Position"] = positions[1].str.strip().astype(np.int64)
+
+    return compact_data(data, cancer_types)
+
+
+def compact_data(data: pd.DataFrame, cancer_types: list[str]) -> pd.DataFrame:
+    """
+    Keep only the columns used by the app, in their memory-lean dtypes.
+    :param data: A prepared HPA DataFrame, possibly with extra columns or default dtypes.
+    :param cancer_types: The cancer types of the HPA prognostics columns.
+    :return: A new DataFrame with a fresh integer index and the cancer types in data.attrs["cancer_types"].
+    """
+    retained_columns = text_columns + categorical_columns + position_columns
+    compact = data[[column for column in data.columns if column in retained_columns]].reset_index(drop=True)
+    compact = compact.astype({
+        **{column: "string[pyarrow]" for column in text_columns},
+        **{column: "category" for column in categorical_columns},
+        **{column: np.int64 for column in position_columns}
+    })
+    compact.attrs["cancer_types"] = list(cancer_types)
+    return compact
@@ -0,0 +1,81 @@
+import numpy as np
+import pandas as pd
+
+
+def prognostic_columns(columns: pd.Index) -> list[str]:
+    """
+    Find the "Pathology prognostics - <cancer type>" columns of a Human Protein Atlas DataFrame.
+    :param columns: The columns of the HPA DataFrame.
+    :return: The prognostics column names, in their original order.
+    """
+    return [column for column in columns if "Pathology prognostics" in column]
+
+
+def cancer_type(prognostic_column: str) -> str:
+    """
+    Get the cancer type from a prognostics column name.
+    :param prognostic_column: A "Pathology prognostics - <cancer type>" column name.
+    :return: The cancer type.
+    """
+    return prognostic_column.split("-")[1].strip()
+
+
+def prognostic_matrix(data: pd.DataFrame, prognostic_type: str) -> pd.DataFrame:
+    """
+    Build a gene x cancer type boolean matrix of prognostics.
+    A cell is True if the protein's prognostics value for that cancer contains prognostic_type as a whole word.
+    :param data: A Human Protein Atlas DataFrame containing the prognostics columns.
+    :param prognostic_type: one of "favorable" or "unfavorable".
+    :return: A boolean DataFrame with the same index as data and one column per cancer type.
+    """
+    columns = prognostic_columns(data.columns)
+
+    # Prognostics values repeat heavily across genes and cancers, so match each distinct value only once.
+    # Missing values get code -1, which indexes the trailing False.
+    codes, values = pd.factorize(data[columns].to_numpy().ravel())
+    matches = pd.Series(values.astype(str)).str.lower().str.contains(rf"(?:^|\s){prognostic_type}(?:\s|$)").to_numpy()
+    matrix = np.append(matches, False)[codes].reshape(len(data), len(columns))
+
+    return pd.DataFrame(matrix, index=data.index, columns=[cancer_type(column) for column in columns])
+
+
+def generate_prognostics(data: pd.DataFrame, prognostic_type: str) -> pd.Series:
+    """
+    Generate the prognostics value for every protein at once.
+    :param data: A Human Protein Atlas DataFrame containing the prognostics columns.
+    :param prognostic_type: one of "favorable" or "unfavorable".
+    :return: A Series of comma-separated strings containing, for each protein, all the cancer types for
+    which the protein has a prognostic_type prognostic.
+    """
+    matrix = prognostic_matrix(data, prognostic_type)
+    prognostics = pd.Series("", index=data.index, dtype=object)
+    for cancer, has_prognostic in matrix.items():
+        prognostics += np.where(has_prognostic.to_numpy(), f"{cancer},", "")
+    return prognostics.str[:-1]
+
+
+def build_prognostic_index(data: pd.DataFrame) -> dict[tuple[str, str], np.ndarray]:
+    """
+    Build an inverted index from (cancer type, prognosis) to the rows of the proteins with that prognostic.
+    :param data: A prepared HPA DataFrame containing the "Favorable prognostics" and "Unfavorable prognostics" columns.
+    :return: A dict mapping (cancer type, prognosis) pairs, with prognosis one of "Favorable" or "Unfavorable",
+    to a sorted array of integer row positions in data.
+    """
+    index = {}
+    for prognosis in ["Favorable", "Unfavorable"]:
+        cancers = pd.Series(data[f"{prognosis} prognostics"].to_numpy()).str.split(",").explode()
+        cancers = cancers[cancers != ""]
+        for cancer, rows in cancers.groupby(cancers).indices.items():
+            index[(cancer, prognosis)] = cancers.index.to_numpy()[rows]
+    return index
+
+
+def prognostic_rows(prognostic_index: dict[tuple[str, str], np.ndarray], cancer: str, prognosis: str) -> np.ndarray:
+    """
+    Look up the rows of the proteins with a given prognostic.
+    :param prognostic_index: The index built by build_prognostic_index.
+    :param cancer: The cancer type.
+    :param prognosis: One of "Favorable" or "Unfavorable".
+    :return: A sorted array of integer row positions.
+    """
+    return prognostic_index.get((cancer, prognosis), np.empty(0, dtype=np.int64))
@@ -0,0 +1,116 @@
+import numpy as np
+import pandas as pd
+
+from data.preparation import protein_class_priority
+
+
+def split_protein_classes(protein_classes: pd.Series) -> pd.Series:
+    """
+    Split the comma-separated "Protein class" values into one row per protein class.
+    :param protein_classes: The "Protein class" column of the HPA DataFrame.
+    :return: A Series of stripped protein classes, indexed by the integer row position of each protein.
+    """
+    classes = pd.Series(protein_classes.to_numpy()).str.split(",").explode().str.strip()
+    return classes[classes.notna() & (classes != "")]
+
+
+def build_protein_class_vocabulary(protein_classes: pd.Series) -> list[str]:
+    """
+    List the protein classes present in the data, with prioritized classes first in priority order,
+    followed by any other class in alphabetical order.
+    :param protein_classes: The "Protein class" column of the HPA DataFrame.
+    :return: The protein class vocabulary. The position of each class is its bit in the protein class masks.
+    """
+    present = set(split_protein_classes(protein_classes))
+    vocabulary = [x for x in protein_class_priority if x in present] + sorted(present - set(protein_class_priority))
+    if len(vocabulary) > 63:
+        raise ValueError(f"Cannot encode {len(vocabulary)} protein classes in a 64-bit mask.")
+    return vocabulary
+
+
+def build_protein_class_masks(protein_classes: pd.Series, vocabulary: list[str]) -> np.ndarray:
+    """
+    Encode the protein classes of every protein as a bitmask.
+    :param protein_classes: The "Protein class" column of the HPA DataFrame.
+    :param vocabulary: The protein class vocabulary, as returned by build_protein_class_vocabulary.
+    :return: An int64 array with one mask per row, where bit i is set if the protein belongs to vocabulary[i].
+    """
+    classes = split_protein_classes(protein_classes)
+    codes = pd.Categorical(classes, categories=vocabulary).codes.astype(np.int64)
+    known = codes >= 0
+    masks = np.zeros(len(protein_classes), dtype=np.int64)
+    np.bitwise_or.at(masks, classes.index.to_numpy()[known], np.left_shift(1, codes[known]))
+    return masks
+
+
+def build_protein_class_order(protein_classes: pd.Series, vocabulary: list[str]) -> np.ndarray:
+    """
+    List the protein classes of every protein in their order in the source data, which the bitmasks do not keep.
+    :param protein_classes: The "Protein class" column of the HPA DataFrame.
+    :param vocabulary: The protein class vocabulary, as returned by build_protein_class_vocabulary.
+    :return: An int8 array with one row per protein, holding the vocabulary positions of its classes in source order,
+    padded with -1.
+    """
+    classes = split_protein_classes(protein_classes)
+    positions = classes.groupby(level=0).cumcount().to_numpy()
+    order = np.full((len(protein_classes), positions.max() + 1 if len(positions) else 0), -1, dtype=np.int8)
+    order[classes.index.to_numpy(), positions] = pd.Categorical(classes, categories=vocabulary).codes
+    return order
+
+
+def protein_class_selection_mask(protein_selection: list[str], vocabulary: list[str]) -> int:
+    """
+    Encode a selection of protein classes as a bitmask.
+    :param protein_selection: The selected protein classes.
+    :param vocabulary: The protein class vocabulary.
+    :return: The bitmask of the selected classes. Classes not in the vocabulary are ignored.
+    """
+    return sum(1 << i for i, x in enumerate(vocabulary) if x in protein_selection)
+
+
+def has_protein_class(masks: np.ndarray, selection_mask: int) -> np.ndarray:
+    """
+    Check which proteins belong to at least one of the selected protein classes.
+    :param masks: The protein class masks of the proteins to check.
+    :param selection_mask: The bitmask of the selected classes.
+    :return: A boolean array with the same length as masks.
+    """
+    return (masks & selection_mask) != 0
+
+
+def first_protein_class(masks: np.ndarray, vocabulary: list[str]) -> np.ndarray:
+    """
+    Get the highest-priority protein class of each mask with a vectorized first-set-bit lookup.
+    :param masks: Non-zero protein class masks.
+    :param vocabulary: The protein class vocabulary.
+    :return: An object array of protein class names.
+    """
+    return np.array(vocabulary, dtype=object)[np.log2(masks & -masks).astype(np.int64)]
+
+
+def primary_protein_class(masks: np.ndarray, selection_mask: int, vocabulary: list[str], default: np.ndarray,
+                          order: np.ndarray) -> np.ndarray:
+    """
+    Get the primary protein class of each protein: its highest-priority prioritized class among the selected ones,
+    or for proteins without a prioritized class their first selected class in source order, or their default primary
+    class if none of their classes is selected.
+    :param masks: The protein class masks of the proteins.
+    :param selection_mask: The bitmask of the selected classes.
+    :param vocabulary: The protein class vocabulary.
+    :param default: The "Default Protein Class" of each protein, its first prioritized protein class.
+    :param order: The protein classes of each protein in source order, as returned by build_protein_class_order.
+    :return: An object array of protein class names.
+    """
+    priority_mask = protein_class_selection_mask(protein_class_priority, vocabulary)
+    prioritized = (masks & priority_mask) != 0
+    primary = default.copy()
+
+    selected = prioritized & ((masks & priority_mask & selection_mask) != 0)
+    primary[selected] = first_protein_class(masks[selected] & priority_mask & selection_mask, vocabulary)
+
+    selected = ~prioritized & ((masks & selection_mask) != 0)
+    codes = order[selected].astype(np.int64)
+    in_selection = (codes >= 0) & (((selection_mask >> np.maximum(codes, 0)) & 1) != 0)
+    first = codes[np.arange(len(codes)), in_selection.argmax(axis=1)]
+    primary[selected] = np.array(vocabulary, dtype=object)[first]
+    return primary
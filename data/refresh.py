@@ -0,0 +1,228 @@
+import argparse
+import dataclasses
+import logging
+import os
+import threading
+from typing import Callable, Optional
+
+import numpy as np
+import pandas as pd
+
+from data.composition import align_composition, discard_composition, read_composition, write_composition
+from data.dataset import HPADataset, build_dataset
+from data.expression import expression_strings, tpm_column_names
+from data.preparation import hpa_url
+from data.snapshot import (fetch_source, prepare_source, read_snapshot, read_snapshot_metadata, snapshot_directory,
+                           source_version, update_snapshot_validators, write_snapshot)
+
+logger = logging.getLogger(__name__)
+
+# Seconds between background refresh checks, 0 to disable them. The source defaults to the one of the snapshot.
+refresh_interval = float(os.environ.get("GCAPRICORN_REFRESH_INTERVAL", 24 * 60 * 60))
+refresh_source = os.environ.get("GCAPRICORN_REFRESH_SOURCE")
+
+# Identifies a gene across HPA releases, in which row positions differ.
+diff_key = "Ensembl"
+
+
+def diff_datasets(old: pd.DataFrame, new: pd.DataFrame) -> pd.DataFrame:
+    """
+    Compare two releases of the prepared HPA data gene by gene.
+    :param old: The prepared DataFrame of the previous release.
+    :param new: The prepared DataFrame of the new release.
+    :return: A DataFrame with one row per added, removed or changed gene, and the "Ensembl", "Gene", "Change"
+    (one of "added", "removed", "changed") and "Changed columns" (comma-separated) columns.
+    """
+    old = old.drop_duplicates(diff_key).set_index(diff_key)
+    new = new.drop_duplicates(diff_key).set_index(diff_key)
+    columns = [column for column in new.columns if column in old.columns]
+
+    common = new.index.intersection(old.index)
+    differs = old.loc[common, columns].astype(str).ne(new.loc[common, columns].astype(str))
+    differs = differs[differs.any(axis=1)]
+    changed_columns = differs.dot(pd.Index(columns) + ", ").str[:-2]
+
+    added = new.index.difference(old.index)
+    removed = old.index.difference(new.index)
+    return pd.concat([
+        pd.DataFrame({diff_key: added, "Gene": new.loc[added, "Gene"].to_numpy(), "Change": "added",
+                      "Changed columns": ""}),
+        pd.DataFrame({diff_key: removed, "Gene": old.loc[removed, "Gene"].to_numpy(), "Change": "removed",
+                      "Changed columns": ""}),
+        pd.DataFrame({diff_key: differs.index, "Gene": new.loc[differs.index, "Gene"].to_numpy(), "Change": "changed",
+                      "Changed columns": changed_columns.to_numpy()})
+    ], ignore_index=True)
+
+
+def comparable_data(dataset: HPADataset) -> pd.DataFrame:
+    """
+    Get the data of a dataset with its expression columns, which are dropped from dataset.data once parsed, so that
+    diff_datasets also compares the expression of the genes.
+    :param dataset: The dataset.
+    :return: A DataFrame with the columns of dataset.data and the nTPM columns, formatted by expression_strings.
+    """
+    return dataset.data.assign(**{column: expression_strings(dataset.expression[by]).to_numpy()
+                                  for by, column in tpm_column_names.items()})
+
+
+def changed_rows(dataset: HPADataset, diff: pd.DataFrame) -> np.ndarray:
+    """
+    Find the rows of a dataset listed in a diff.
+    :param dataset: The old or new dataset of the diff.
+    :param diff: The diff returned by diff_datasets.
+    :return: The integer row positions of the genes of the diff present in the dataset.
+    """
+    return np.flatnonzero(dataset.data[diff_key].isin(diff[diff_key]).to_numpy())
+
+
+def changed_accessions(diff: pd.DataFrame, old: HPADataset, new: HPADataset) -> set[str]:
+    """
+    Get the UniProt IDs of the genes of a diff, before and after the change.
+    :return: The set of UniProt IDs.
+    """
+    return set(old.data["Uniprot"].iloc[changed_rows(old, diff)]) | \
+        set(new.data["Uniprot"].iloc[changed_rows(new, diff)])
+
+
+def affected_filters(diff: pd.DataFrame, old: HPADataset, new: HPADataset) -> set[tuple[str, str]]:
+    """
+    Get the (cancer type, prognosis) filters whose results include a gene of a diff, before or after the change.
+    Results of all other filters are the same in both datasets.
+    :return: The set of (cancer type, prognosis) pairs.
+    """
+    affected = set()
+    for dataset in [old, new]:
+        rows = changed_rows(dataset, diff)
+        affected.update(key for key, prognostic_rows in dataset.prognostic_index.items()
+                        if np.isin(prognostic_rows, rows).any())
+    return affected
+
+
+class DatasetRefresher:
+    """
+    Holds the current dataset and replaces it when a new Human Protein Atlas release is available.
+    Refreshes run on a background thread: the new release is fetched conditionally, prepared, written as the new
+    snapshot and indexed while sessions keep using the current dataset, which is then swapped in one assignment.
+    Listeners are called with the diff and both datasets before the swap, to invalidate the caches of changed genes.
+    """
+
+    def __init__(self, dataset: HPADataset, source: str = hpa_url, directory: str = snapshot_directory,
+                 interval: float = refresh_interval, validators: Optional[dict] = None):
+        self.dataset = dataset
+        self.source = source
+        self.directory = directory
+        self.interval = interval
+        self.validators = validators or {}
+        self.last_diff: Optional[pd.DataFrame] = None
+        self._listeners: list[Callable[[pd.DataFrame, HPADataset, HPADataset], None]] = []
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def add_listener(self, listener: Callable[[pd.DataFrame, HPADataset, HPADataset], None]) -> None:
+        """
+        Register a function called as listener(diff, old_dataset, new_dataset) on every refresh.
+        :return: None.
+        """
+        self._listeners.append(listener)
+
+    def refresh(self) -> Optional[pd.DataFrame]:
+        """
+        Check for a new release and swap it in.
+        :return: The diff of the new release, or None if the data did not change.
+        """
+        with self._lock:
+            fetched = fetch_source(self.source, self.validators)
+            if fetched is None:
+                return None
+            raw, validators = fetched
+            if source_version(raw) == self.dataset.version:
+                self.validators = validators
+                try:
+                    update_snapshot_validators(self.dataset.version, validators, self.directory)
+                except OSError:
+                    logger.warning("Could not update the snapshot validators", exc_info=True)
+                return None
+
+            data, metadata = prepare_source(self.source, raw, validators)
+            try:
+                write_snapshot(data, metadata, self.directory)
+            except OSError:
+                logger.warning("Could not write the snapshot of HPA release %s", metadata["version"], exc_info=True)
+            dataset = build_dataset(data)
+            diff = diff_datasets(comparable_data(self.dataset), comparable_data(dataset))
+            composition = read_composition(self.directory)
+            if composition is not None:
+                # The sequences of changed proteins are discarded by the listeners, so their counts are stale too.
+                # They are left out until the composition matrix is rebuilt with `python -m data.composition`.
+                current = discard_composition(composition, changed_accessions(diff, self.dataset, dataset))
+                if len(current.accessions) < len(composition.accessions):
+                    try:
+                        write_composition(current, self.directory)
+                    except OSError:
+                        logger.warning("Could not write the composition matrix", exc_info=True)
+                dataset = dataclasses.replace(dataset,
+                                              composition=align_composition(current, dataset.data["Uniprot"]))
+
+            for listener in self._listeners:
+                listener(diff, self.dataset, dataset)
+            self.dataset = dataset
+            self.validators = validators
+            self.last_diff = diff
+            logger.info("Refreshed HPA data to release %s: %s", dataset.version,
+                        diff["Change"].value_counts().to_dict())
+            return diff
+
+    def start(self) -> None:
+        """
+        Start checking for new releases every interval seconds on a daemon thread.
+        :return: None.
+        """
+        if self._thread is None and self.interval > 0:
+            self._thread = threading.Thread(target=self._run, name="hpa-refresh", daemon=True)
+            self._thread.start()
+
+    def stop(self) -> None:
+        """
+        Stop the background checks.
+        :return: None.
+        """
+        self._stopped.set()
+
+    def _run(self) -> None:
+        while not self._stopped.wait(self.interval):
+            try:
+                self.refresh()
+            except Exception:
+                logger.exception("HPA data refresh failed")
+
+
+def main(argv: list[str] = None) -> None:
+    parser = argparse.ArgumentParser(
+        description="Refresh the Human Protein Atlas snapshot if its source changed, and report the changed genes."
+    )
+    parser.add_argument("--source", default=None,
+                        help="Local path or URL of the proteinatlas.tsv(.zip) file. Defaults to the snapshot source.")
+    parser.add_argument("--directory", default=snapshot_directory,
+                        help=f"Directory of the snapshot. Defaults to '{snapshot_directory}'.")
+    parser.add_argument("--report", default=None, help="Optional CSV file to write the changed genes to.")
+    args = parser.parse_args(argv)
+
+    metadata = read_snapshot_metadata(args.directory)
+    if metadata is None:
+        parser.error(f"No snapshot in {args.directory}, build one with `python -m data.snapshot` first.")
+    dataset = build_dataset(read_snapshot(args.directory), read_composition(args.directory))
+    refresher = DatasetRefresher(dataset, source=args.source or metadata["source"],
+                                 directory=args.directory, validators=metadata.get("validators"))
+    diff = refresher.refresh()
+    if diff is None:
+        print(f"Snapshot {metadata['version']} is up to date")
+        return
+    print(f"Refreshed snapshot {metadata['version']} to {refresher.dataset.version}: "
+          f"{', '.join(f'{count} {change}' for change, count in diff['Change'].value_counts().items())}")
+    if args.report is not None:
+        diff.to_csv(args.report, index=False)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,229 @@
+import argparse
+import errno
+import gzip
+import os
+import threading
+from contextlib import contextmanager
+from typing import BinaryIO, Iterable, Iterator, Optional
+
+try:
+    import fcntl
+except ImportError:
+    # Windows has no flock, files are locked with msvcrt instead.
+    fcntl = None
+    import msvcrt
+
+cache_directory = os.environ.get("GCAPRICORN_CACHE_DIR", "cache")
+# Attempts to lock the store on Windows, each of which waits for up to 10 seconds, before giving up on a stuck writer.
+sequence_store_lock_attempts = 3
+
+
+@contextmanager
+def exclusive_lock(file: BinaryIO) -> Iterator[None]:
+    """
+    Hold an exclusive lock on an open file, shared with other processes, waiting for it if needed.
+    Uses flock on Unix, and a lock of the first byte of the file on Windows.
+    :param file: The open file.
+    :return: A context manager holding the lock.
+    :raises OSError: On Windows, if the lock could not be acquired within sequence_store_lock_attempts attempts.
+    """
+    if fcntl is not None:
+        fcntl.flock(file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(file, fcntl.LOCK_UN)
+        return
+
+    file.seek(0)
+    for attempt in range(sequence_store_lock_attempts):
+        try:
+            # Retries once per second for 10 seconds before raising.
+            msvcrt.locking(file.fileno(), msvcrt.LK_LOCK, 1)
+            break
+        except OSError as error:
+            if error.errno not in (errno.EDEADLK, errno.EACCES) or attempt == sequence_store_lock_attempts - 1:
+                raise
+    try:
+        yield
+    finally:
+        file.flush()
+        file.seek(0)
+        msvcrt.locking(file.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+class SequenceStore:
+    """
+    On-disk protein sequence store keyed by UniProt accession.
+    Sequences are appended unwrapped to a FASTA file, and an index file maps each accession to the offset and length
+    of its sequence, so a lookup is a dict access and a single positioned read. Writers hold an exclusive file lock
+    and write sequences before their index entries, so several processes can share a store: readers pick up new
+    entries by reading the index lines appended since their last refresh. Discarded sequences get an index entry
+    with a negative offset, and are replaced by the next put of their accession.
+    """
+
+    def __init__(self, directory: str = os.path.join(cache_directory, "sequences")):
+        os.makedirs(directory, exist_ok=True)
+        self.fasta_path = os.path.join(directory, "sequences.fasta")
+        self.index_path = os.path.join(directory, "sequences.idx")
+        for path in [self.fasta_path, self.index_path]:
+            open(path, "ab").close()
+        self._offsets: dict[str, tuple[int, int]] = {}
+        self._index_position = 0
+        self._lock = threading.Lock()
+        self._refresh()
+
+    def _refresh(self) -> None:
+        """
+        Read the index entries appended since the last refresh.
+        :return: None.
+        """
+        with self._lock:
+            if os.path.getsize(self.index_path) == self._index_position:
+                return
+            with open(self.index_path, "rb") as index_file:
+                index_file.seek(self._index_position)
+                entries = index_file.read()
+            # Only consume complete lines, another process may be halfway through appending one.
+            entries = entries[:entries.rfind(b"\n") + 1]
+            for entry in entries.decode().splitlines():
+                accession, offset, length = entry.split("\t")
+                if int(offset) < 0:
+                    self._offsets.pop(accession, None)
+                else:
+                    self._offsets[accession] = (int(offset), int(length))
+            self._index_position += len(entries)
+
+    def __contains__(self, accession: str) -> bool:
+        if accession not in self._offsets:
+            self._refresh()
+        return accession in self._offsets
+
+    def __len__(self) -> int:
+        self._refresh()
+        return len(self._offsets)
+
+    def get(self, accession: str) -> Optional[str]:
+        """
+        Look up a sequence.
+        :param accession: UniProt accession.
+        :return: The sequence, or None if it is not in the store.
+        """
+        if accession not in self:
+            return None
+        offset, length = self._offsets[accession]
+        with open(self.fasta_path, "rb") as fasta_file:
+            fasta_file.seek(offset)
+            return fasta_file.read(length).decode()
+
+    def put(self, accession: str, sequence: str) -> None:
+        """
+        Add a sequence to the store.
+        :param accession: UniProt accession.
+        :param sequence: The protein sequence as a string of 1-letter amino acids.
+        :return: None.
+        """
+        self.put_many([(accession, sequence)])
+
+    def put_many(self, records: Iterable[tuple[str, str]]) -> int:
+        """
+        Add sequences to the store, skipping accessions that are already stored.
+        :param records: (accession, sequence) pairs.
+        :return: The number of sequences added.
+        """
+        added = 0
+        with open(self.index_path, "ab") as index_file, open(self.fasta_path, "ab") as fasta_file:
+            with exclusive_lock(index_file):
+                self._refresh()
+                offset = fasta_file.seek(0, os.SEEK_END)
+                entries = []
+                for accession, sequence in records:
+                    if accession in self._offsets or "\t" in accession or "\n" in accession:
+                        continue
+                    header = f">{accession}\n".encode()
+                    data = sequence.encode()
+                    fasta_file.write(header + data + b"\n")
+                    entries.append(f"{accession}\t{offset + len(header)}\t{len(data)}\n")
+                    self._offsets[accession] = (offset + len(header), len(data))
+                    offset += len(header) + len(data) + 1
+                    added += 1
+                fasta_file.flush()
+                os.fsync(fasta_file.fileno())
+                index_file.write("".join(entries).encode())
+                index_file.flush()
+                with self._lock:
+                    self._index_position = os.path.getsize(self.index_path)
+        return added
+
+    def discard(self, accessions: Iterable[str]) -> int:
+        """
+        Remove sequences from the store, e.g. when the proteins they belong to changed. The sequence data stays in the
+        FASTA file until the store is rebuilt.
+        :param accessions: UniProt accessions.
+        :return: The number of sequences removed.
+        """
+        with open(self.index_path, "ab") as index_file:
+            with exclusive_lock(index_file):
+                self._refresh()
+                discarded = [accession for accession in set(accessions) if accession in self._offsets]
+                index_file.write("".join(f"{accession}\t-1\t0\n" for accession in discarded).encode())
+                index_file.flush()
+                with self._lock:
+                    for accession in discarded:
+                        del self._offsets[accession]
+                    self._index_position = os.path.getsize(self.index_path)
+        return len(discarded)
+
+    def load_fasta(self, path: str) -> int:
+        """
+        Bulk-load a UniProt FASTA file, such as a UniProtKB proteome download.
+        :param path: Path to the FASTA file, optionally gzip-compressed.
+        :return: The number of sequences added.
+        """
+        return self.put_many(read_fasta(path))
+
+
+def fasta_accession(header: str) -> str:
+    """
+    Get the accession from a FASTA header line.
+    :param header: A header such as ">sp|P04637|P53_HUMAN Cellular tumor antigen p53 ...".
+    :return: The UniProt accession for UniProt headers, or else the first word of the header.
+    """
+    identifier = header[1:].split()[0]
+    parts = identifier.split("|")
+    return parts[1] if len(parts) >= 3 else identifier
+
+
+def read_fasta(path: str) -> Iterator[tuple[str, str]]:
+    """
+    Read the records of a FASTA file.
+    :param path: Path to the FASTA file, optionally gzip-compressed.
+    :return: An iterator of (accession, sequence) pairs.
+    """
+    with (gzip.open(path, "rt") if path.endswith(".gz") else open(path)) as fasta_file:
+        accession, sequence = None, []
+        for line in fasta_file:
+            if line.startswith(">"):
+                if accession is not None:
+                    yield accession, "".join(sequence)
+                accession, sequence = fasta_accession(line), []
+            else:
+                sequence.append(line.strip())
+        if accession is not None:
+            yield accession, "".join(sequence)
+
+
+def main(argv: list[str] = None) -> None:
+    parser = argparse.ArgumentParser(description="Bulk-load a UniProt FASTA file into the local sequence store.")
+    parser.add_argument("fasta", help="Path to the FASTA file, optionally gzip-compressed.")
+    parser.add_argument("--directory", default=os.path.join(cache_directory, "sequences"),
+                        help="Directory of the sequence store.")
+    args = parser.parse_args(argv)
+
+    store = SequenceStore(args.directory)
+    added = store.load_fasta(args.fasta)
+    print(f"Added {added} sequences, {len(store)} sequences in {args.directory}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,265 @@
+import argparse
+import gzip
+import os
+from typing import Iterator, NamedTuple, Optional
+
+import numpy as np
+
+from data.sequence_store import cache_directory
+
+# Length of the k-mers shared between a query and the indexed sequences.
+kmer_length = 5
+# Residues of the k-mer alphabet. Windows with any other residue (e.g. X, U, or a sequence boundary) are not indexed.
+kmer_alphabet = "ACDEFGHIKLMNPQRSTVWY"
+residue_codes = np.full(256, len(kmer_alphabet), dtype=np.int32)
+residue_codes[np.frombuffer(kmer_alphabet.encode(), dtype=np.uint8)] = np.arange(len(kmer_alphabet))
+
+# Candidates scoring below this fraction of shared k-mers are not returned.
+similarity_min_score = 0.1
+similarity_index_path = os.path.join(cache_directory, "pdb_seqres.npz")
+
+
+class SimilarityIndex(NamedTuple):
+    """
+    K-mer inverted index over the distinct protein chain sequences of the PDB.
+    Sequences are concatenated in residues, separated by a newline, with sequence i at
+    residues[sequence_indptr[i]:sequence_indptr[i + 1] - 1]. The sorted k-mer codes in kmer_keys have their sequences
+    at postings[kmer_indptr[j]:kmer_indptr[j + 1]], and sequence i belongs to the PDB entries
+    entries[entry_indices[entry_indptr[i]:entry_indptr[i + 1]]].
+    """
+    residues: np.ndarray
+    sequence_indptr: np.ndarray
+    kmer_counts: np.ndarray
+    kmer_keys: np.ndarray
+    kmer_indptr: np.ndarray
+    postings: np.ndarray
+    entries: np.ndarray
+    entry_indptr: np.ndarray
+    entry_indices: np.ndarray
+
+
+def read_seqres(path: str) -> Iterator[tuple[str, str]]:
+    """
+    Read the protein chains of a PDB seqres FASTA file, such as pdb_seqres.txt from the wwPDB.
+    :param path: Path to the FASTA file, optionally gzip-compressed.
+    :return: An iterator of (PDB ID, sequence) pairs. Nucleic acid chains are skipped.
+    """
+    with (gzip.open(path, "rt") if path.endswith(".gz") else open(path)) as fasta_file:
+        pdb_id, sequence = None, []
+        for line in fasta_file:
+            if line.startswith(">"):
+                if pdb_id is not None and sequence:
+                    yield pdb_id, "".join(sequence)
+                # Headers look like ">101m_A mol:protein length:154  MYOGLOBIN".
+                identifier, _, description = line[1:].partition(" ")
+                pdb_id = identifier.split("_")[0].upper() if description.startswith("mol:protein") else None
+                sequence = []
+            elif pdb_id is not None:
+                sequence.append(line.strip())
+        if pdb_id is not None and sequence:
+            yield pdb_id, "".join(sequence)
+
+
+def kmer_codes(residues: np.ndarray) -> np.ndarray:
+    """
+    Encode the k-mers of concatenated sequences.
+    :param residues: The residues as an uint8 array of one-letter codes.
+    :return: The code of the k-mer starting at every position, or -1 where the window holds a residue outside of
+    kmer_alphabet or runs past the end.
+    """
+    codes = residue_codes[residues].astype(np.int64)
+    windows = len(residues) - kmer_length + 1
+    if windows <= 0:
+        return np.empty(0, dtype=np.int64)
+    kmers = np.zeros(windows, dtype=np.int64)
+    invalid = np.zeros(windows, dtype=bool)
+    for offset in range(kmer_length):
+        window = codes[offset:offset + windows]
+        kmers = kmers * len(kmer_alphabet) + np.minimum(window, len(kmer_alphabet) - 1)
+        invalid |= window == len(kmer_alphabet)
+    kmers[invalid] = -1
+    return kmers
+
+
+def build_similarity_index(chains: Iterator[tuple[str, str]]) -> SimilarityIndex:
+    """
+    Build the k-mer index of PDB chains. Identical sequences are indexed once, with all the entries they appear in.
+    :param chains: (PDB ID, sequence) pairs, as returned by read_seqres.
+    :return: The similarity index.
+    """
+    sequence_entries: dict[str, dict[str, None]] = {}
+    for pdb_id, sequence in chains:
+        sequence_entries.setdefault(sequence.upper(), {})[pdb_id] = None
+    sequences = list(sequence_entries)
+
+    residues = np.frombuffer("".join(f"{sequence}\n" for sequence in sequences).encode("ascii", errors="replace"),
+                             dtype=np.uint8)
+    sequence_indptr = np.zeros(len(sequences) + 1, dtype=np.int64)
+    np.cumsum([len(sequence) + 1 for sequence in sequences], out=sequence_indptr[1:])
+
+    # Distinct (k-mer, sequence) pairs, sorted by k-mer and then by sequence.
+    kmers = kmer_codes(residues)
+    positions = np.flatnonzero(kmers >= 0)
+    pairs = np.unique(kmers[positions] * len(sequences) + np.searchsorted(sequence_indptr, positions, "right") - 1)
+    kmer_keys, kmer_starts = np.unique(pairs // len(sequences), return_index=True)
+    postings = (pairs % len(sequences)).astype(np.int32)
+
+    entries = np.array(sorted({pdb_id for pdb_ids in sequence_entries.values() for pdb_id in pdb_ids}), dtype=str)
+    entry_positions = {pdb_id: position for position, pdb_id in enumerate(entries)}
+    entry_lists = [[entry_positions[pdb_id] for pdb_id in sequence_entries[sequence]] for sequence in sequences]
+    entry_indptr = np.zeros(len(sequences) + 1, dtype=np.int64)
+    np.cumsum([len(entry_list) for entry_list in entry_lists], out=entry_indptr[1:])
+
+    return SimilarityIndex(
+        residues=residues,
+        sequence_indptr=sequence_indptr,
+        kmer_counts=np.bincount(postings, minlength=len(sequences)).astype(np.int32),
+        kmer_keys=kmer_keys.astype(np.int32),
+        kmer_indptr=np.append(kmer_starts, len(postings)).astype(np.int64),
+        postings=postings,
+        entries=entries,
+        entry_indptr=entry_indptr,
+        entry_indices=np.array([position for entry_list in entry_lists for position in entry_list], dtype=np.int32)
+    )
+
+
+def write_similarity_index(index: SimilarityIndex, path: str = similarity_index_path) -> None:
+    """
+    Write a similarity index.
+    :param index: The similarity index.
+    :param path: Path of the .npz file.
+    :return: None.
+    """
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(f"{path}.tmp", "wb") as file:
+        np.savez(file, **index._asdict())
+    os.replace(f"{path}.tmp", path)
+
+
+def read_similarity_index(path: str = similarity_index_path) -> Optional[SimilarityIndex]:
+    """
+    Read a similarity index.
+    :param path: Path of the .npz file.
+    :return: The similarity index, or None if it was not built.
+    """
+    try:
+        with np.load(path) as file:
+            return SimilarityIndex(**{field: file[field] for field in SimilarityIndex._fields})
+    except (OSError, KeyError, ValueError):
+        return None
+
+
+def index_sequence(index: SimilarityIndex, position: int) -> str:
+    """
+    Get an indexed sequence.
+    :param index: The similarity index.
+    :param position: Position of the sequence in the index.
+    :return: The sequence.
+    """
+    return index.residues[index.sequence_indptr[position]:index.sequence_indptr[position + 1] - 1].tobytes().decode()
+
+
+def sequence_identity(query: str, target: str) -> float:
+    """
+    Estimate the identity of two sequences with an alignment anchored on the k-mers they share, in linear time.
+    Every residue of the query is compared with the residue of the target on the diagonal of the closest shared k-mer
+    before and after it, which follows the substitutions and indels between shared k-mers.
+    :param query: The query sequence.
+    :param target: The target sequence.
+    :return: The fraction of matching residues relative to the longer sequence, from 0 to 1.
+    """
+    query_residues = np.frombuffer(query.encode("ascii", errors="replace"), dtype=np.uint8)
+    target_residues = np.frombuffer(target.encode("ascii", errors="replace"), dtype=np.uint8)
+    if len(query_residues) == 0 or len(target_residues) == 0:
+        return 0.0
+    query_kmers, target_kmers = kmer_codes(query_residues), kmer_codes(target_residues)
+
+    # Anchor on the k-mers occurring once in the target, so that repeats do not multiply the anchors.
+    target_codes, target_starts, target_counts = np.unique(target_kmers, return_index=True, return_counts=True)
+    unique = (target_codes >= 0) & (target_counts == 1)
+    target_codes, target_starts = target_codes[unique], target_starts[unique]
+    matches = np.minimum(np.searchsorted(target_codes, query_kmers), max(len(target_codes) - 1, 0))
+    anchors = np.flatnonzero((query_kmers >= 0) & (target_codes[matches] == query_kmers)) if len(target_codes) else []
+    if len(anchors) == 0:
+        # Without such a k-mer, e.g. between low-complexity sequences, the sequences are compared without gaps.
+        anchors, diagonals = np.zeros(1, dtype=np.int64), np.zeros(1, dtype=np.int64)
+    else:
+        diagonals = target_starts[matches[anchors]] - anchors
+
+    positions = np.arange(len(query_residues))
+    previous = np.searchsorted(anchors, positions, "right") - 1
+    following = np.minimum(previous + 1, len(anchors) - 1)
+    matched = np.zeros(len(query_residues), dtype=bool)
+    for diagonal in [diagonals[np.maximum(previous, 0)], diagonals[following]]:
+        target_positions = positions + diagonal
+        valid = (target_positions >= 0) & (target_positions < len(target_residues))
+        matched[valid] |= query_residues[valid] == target_residues[target_positions[valid]]
+    return matched.sum() / max(len(query_residues), len(target_residues))
+
+
+def search_similar_sequences(index: SimilarityIndex, sequence: str, top_k: int = 25,
+                             refine: bool = False) -> list[tuple[str, float]]:
+    """
+    Search for the PDB entries with chains similar to a protein sequence.
+    Candidates are scored on the fraction of distinct k-mers they share with the query, relative to the sequence
+    with more k-mers, which approximates their identity and coverage.
+    :param index: The similarity index.
+    :param sequence: The protein sequence as a string of 1-letter amino acids.
+    :param top_k: Maximum number of PDB entries to return.
+    :param refine: Whether to rescore the best candidates with their identity to the query, as estimated by
+    sequence_identity, which is slower but less sensitive to the repeats and composition of the sequences.
+    :return: A list of (PDB ID, score) pairs sorted by decreasing score, with scores from 0 to 1.
+    """
+    query_kmers = kmer_codes(np.frombuffer(sequence.upper().encode("ascii", errors="replace"), dtype=np.uint8))
+    query_kmers = np.unique(query_kmers[query_kmers >= 0])
+    # An index of no sequences, or of sequences too short or unusual to hold a k-mer, has no k-mer to look up.
+    if len(query_kmers) == 0 or len(index.kmer_keys) == 0:
+        return []
+    keys = np.searchsorted(index.kmer_keys, query_kmers)
+    keys = keys[(keys < len(index.kmer_keys)) & (index.kmer_keys[np.minimum(keys, len(index.kmer_keys) - 1)] ==
+                                                 query_kmers)]
+
+    # Gather the postings of all query k-mers at once, and count the k-mers shared with every sequence.
+    starts, ends = index.kmer_indptr[keys], index.kmer_indptr[keys + 1]
+    lengths = ends - starts
+    offsets = np.repeat(starts - np.cumsum(lengths) + lengths, lengths) + np.arange(lengths.sum())
+    shared = np.bincount(index.postings[offsets], minlength=len(index.kmer_counts))
+
+    candidates = np.flatnonzero(shared)
+    scores = shared[candidates] / np.maximum(index.kmer_counts[candidates], len(query_kmers))
+    keep = scores >= similarity_min_score
+    candidates, scores = candidates[keep], scores[keep]
+    order = np.argsort(-scores, kind="stable")
+    candidates, scores = candidates[order], scores[order]
+
+    if refine:
+        best = min(len(candidates), top_k)
+        refined = [sequence_identity(sequence.upper(), index_sequence(index, position))
+                   for position in candidates[:best]]
+        order = np.argsort(-np.array(refined), kind="stable")
+        candidates, scores = candidates[:best][order], np.array(refined)[order]
+
+    structures = {}
+    for position, score in zip(candidates, scores):
+        for entry in index.entry_indices[index.entry_indptr[position]:index.entry_indptr[position + 1]]:
+            structures.setdefault(str(index.entries[entry]), float(score))
+        if len(structures) >= top_k:
+            break
+    return list(structures.items())[:top_k]
+
+
+def main(argv: list[str] = None) -> None:
+    parser = argparse.ArgumentParser(
+        description="Build the local sequence similarity index of PDB structures from a PDB seqres FASTA file."
+    )
+    parser.add_argument("seqres", help="Path to pdb_seqres.txt, optionally gzip-compressed.")
+    parser.add_argument("--output", default=similarity_index_path, help="Path of the index file.")
+    args = parser.parse_args(argv)
+
+    index = build_similarity_index(read_seqres(args.seqres))
+    write_similarity_index(index, args.output)
+    print(f"Indexed {len(index.kmer_counts)} distinct sequences of {len(index.entries)} PDB entries to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,199 @@
+import argparse
+import hashlib
+import io
+import json
+import os
+import time
+from typing import Optional
+
+import pandas as pd
+
+from data.http_client import http_client
+from data.preparation import compact_data, hpa_url, prepare_data
+
+# Bump whenever prepare_data() changes the derived columns, so that stale snapshots are rebuilt.
+snapshot_format_version = 3
+snapshot_directory = os.environ.get("GCAPRICORN_SNAPSHOT_DIR", "snapshots")
+snapshot_metadata_file = "proteinatlas.json"
+
+
+def fetch_source(source: str, validators: dict) -> Optional[tuple[bytes, dict]]:
+    """
+    Read a Human Protein Atlas file only if it changed since it was last read.
+    URLs are requested conditionally on their ETag and Last-Modified headers. Local files, which stand in for the HPA
+    download in testing, are compared on their modification time and size.
+    :param source: Local path or URL of the proteinatlas.tsv file.
+    :param validators: The validators returned by the previous fetch, or an empty dict.
+    :return: The file contents and their validators, or None if the file did not change.
+    """
+    if os.path.exists(source):
+        stat = os.stat(source)
+        current = {"mtime": stat.st_mtime_ns, "size": stat.st_size}
+        if current == validators:
+            return None
+        with open(source, "rb") as file:
+            return file.read(), current
+
+    headers = {}
+    if "etag" in validators:
+        headers["If-None-Match"] = validators["etag"]
+    if "last_modified" in validators:
+        headers["If-Modified-Since"] = validators["last_modified"]
+    response = http_client.get(source, headers=headers, timeout=600)
+    if response.status_code == 304:
+        return None
+    response.raise_for_status()
+    current = {"etag": response.headers.get("ETag"), "last_modified": response.headers.get("Last-Modified")}
+    return response.content, {key: value for key, value in current.items() if value}
+
+
+def read_source(source: str) -> bytes:
+    """
+    Read the raw bytes of a Human Protein Atlas TSV file.
+    :param source: Local path or URL of the proteinatlas.tsv file, optionally zip- or gzip-compressed.
+    :return: The raw file contents.
+    """
+    raw, _ = fetch_source(source, {})
+    return raw
+
+
+def source_version(raw: bytes) -> str:
+    """
+    Get the version of a Human Protein Atlas file from its contents.
+    :param raw: The raw file contents.
+    :return: The first 16 hexadecimal digits of the SHA-256 of the contents.
+    """
+    return hashlib.sha256(raw).hexdigest()[:16]
+
+
+def prepare_source(source: str = hpa_url, raw: Optional[bytes] = None,
+                   validators: Optional[dict] = None) -> tuple[pd.DataFrame, dict]:
+    """
+    Parse a Human Protein Atlas TSV file and compute all derived columns.
+    :param source: Local path or URL of the proteinatlas.tsv file.
+    :param raw: The contents of the file, if already read. Read from source otherwise, with its validators.
+    :param validators: The cache validators of the file, such as its ETag, stored with the snapshot metadata
+    for conditional refreshes.
+    :return: The prepared DataFrame, with its version in data.attrs["version"], and the snapshot metadata
+    describing it.
+    """
+    if raw is None:
+        raw, validators = fetch_source(source, {})
+    compression = "zip" if source.endswith(".zip") else "gzip" if source.endswith(".gz") else None
+    data = prepare_data(pd.read_csv(io.BytesIO(raw), compression=compression, sep="\t"))
+    metadata = {
+        "format_version": snapshot_format_version,
+        "version": source_version(raw),
+        "source": source,
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "rows": len(data),
+        "cancer_types": data.attrs["cancer_types"],
+        "validators": validators or {}
+    }
+    data.attrs["version"] = metadata["version"]
+    return data, metadata
+
+
+def read_snapshot_metadata(directory: str = snapshot_directory) -> Optional[dict]:
+    """
+    Read the metadata of the current snapshot.
+    :param directory: Directory containing the snapshot.
+    :return: The metadata as a dict, or None if there is no usable snapshot.
+    """
+    try:
+        with open(os.path.join(directory, snapshot_metadata_file)) as file:
+            metadata = json.load(file)
+    except (OSError, json.JSONDecodeError):
+        return None
+    if metadata.get("format_version") != snapshot_format_version:
+        return None
+    if not os.path.exists(os.path.join(directory, metadata["file"])):
+        return None
+    return metadata
+
+
+def write_snapshot(data: pd.DataFrame, metadata: dict, directory: str = snapshot_directory) -> dict:
+    """
+    Write a prepared HPA DataFrame as a versioned Parquet snapshot.
+    The data file is written under a versioned name and only then published by replacing the metadata file,
+    so readers never observe a partially written snapshot.
+    :param data: The prepared DataFrame, as returned by prepare_source.
+    :param metadata: The snapshot metadata, as returned by prepare_source.
+    :param directory: Directory to write the snapshot to.
+    :return: The metadata of the written snapshot.
+    """
+    os.makedirs(directory, exist_ok=True)
+    metadata = {**metadata, "file": f"proteinatlas-{metadata['version']}.parquet"}
+
+    data_path = os.path.join(directory, metadata["file"])
+    data.to_parquet(f"{data_path}.tmp", index=False)
+    os.replace(f"{data_path}.tmp", data_path)
+
+    write_snapshot_metadata(metadata, directory)
+
+    for file_name in os.listdir(directory):
+        if file_name.startswith("proteinatlas-") and file_name != metadata["file"]:
+            os.remove(os.path.join(directory, file_name))
+    return metadata
+
+
+def write_snapshot_metadata(metadata: dict, directory: str = snapshot_directory) -> None:
+    """
+    Replace the metadata file of a snapshot atomically.
+    :param metadata: The snapshot metadata, as returned by write_snapshot.
+    :param directory: Directory containing the snapshot.
+    :return: None.
+    """
+    metadata_path = os.path.join(directory, snapshot_metadata_file)
+    with open(f"{metadata_path}.tmp", "w") as file:
+        json.dump(metadata, file, indent=2)
+    os.replace(f"{metadata_path}.tmp", metadata_path)
+
+
+def update_snapshot_validators(version: str, validators: dict, directory: str = snapshot_directory) -> None:
+    """
+    Record new cache validators for an unchanged source, so that the next conditional fetch, even after a restart,
+    does not download it again.
+    :param version: The version the source still has. Nothing is written if the snapshot is of another version.
+    :param validators: The validators returned by fetch_source.
+    :param directory: Directory containing the snapshot.
+    :return: None.
+    """
+    metadata = read_snapshot_metadata(directory)
+    if metadata is not None and metadata["version"] == version and metadata.get("validators") != validators:
+        write_snapshot_metadata({**metadata, "validators": validators}, directory)
+
+
+def read_snapshot(directory: str = snapshot_directory) -> Optional[pd.DataFrame]:
+    """
+    Read the current snapshot, memory-mapping the Parquet file.
+    :param directory: Directory containing the snapshot.
+    :return: The prepared HPA DataFrame, with the snapshot version in data.attrs["version"],
+    or None if there is no usable snapshot.
+    """
+    metadata = read_snapshot_metadata(directory)
+    if metadata is None:
+        return None
+    data = pd.read_parquet(os.path.join(directory, metadata["file"]), memory_map=True)
+    data = compact_data(data, metadata["cancer_types"])
+    data.attrs["version"] = metadata["version"]
+    return data
+
+
+def main(argv: list[str] = None) -> None:
+    parser = argparse.ArgumentParser(
+        description="Build a columnar snapshot of the Human Protein Atlas with all derived columns precomputed."
+    )
+    parser.add_argument("--source", default=hpa_url,
+                        help="Local path or URL of the proteinatlas.tsv(.zip) file. Defaults to the HPA download.")
+    parser.add_argument("--directory", default=snapshot_directory,
+                        help=f"Directory to write the snapshot to. Defaults to '{snapshot_directory}'.")
+    args = parser.parse_args(argv)
+
+    metadata = write_snapshot(*prepare_source(args.source), directory=args.directory)
+    print(f"Wrote snapshot {metadata['version']} ({metadata['rows']} rows) to "
+          f"{os.path.join(args.directory, metadata['file'])}")
+
+
+if __name__ == "__main__":
+    main()
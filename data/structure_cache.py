@@ -0,0 +1,155 @@
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from typing import Optional
+
+from data.sequence_store import cache_directory
+
+# Default byte budgets of the two cache tiers.
+structure_disk_budget = 2 * 1024 ** 3
+structure_memory_budget = 64 * 1024 ** 2
+
+
+class StructureCache:
+    """
+    Two-tier cache of compressed structure files keyed by PDB ID, regardless of its case.
+    On disk, files are stored under the SHA-256 of their content, and a small reference file per PDB ID points to
+    the content. In memory, the most recently used compressed files are kept in an LRU. Both tiers evict
+    their least recently used files once they exceed their byte budget.
+    """
+
+    def __init__(self, directory: str = os.path.join(cache_directory, "structures"),
+                 disk_budget: int = structure_disk_budget, memory_budget: int = structure_memory_budget):
+        self.blob_directory = os.path.join(directory, "blobs")
+        self.reference_directory = os.path.join(directory, "refs")
+        os.makedirs(self.blob_directory, exist_ok=True)
+        os.makedirs(self.reference_directory, exist_ok=True)
+        self.disk_budget = disk_budget
+        self.memory_budget = memory_budget
+
+        self._memory: OrderedDict[str, bytes] = OrderedDict()
+        self._memory_bytes = 0
+        self._disk_bytes = sum(entry.stat().st_size for entry in os.scandir(self.blob_directory))
+        self._lock = threading.Lock()
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    def _reference_path(self, pdb_id: str) -> str:
+        return os.path.join(self.reference_directory, pdb_id)
+
+    def _blob_path(self, digest: str) -> str:
+        return os.path.join(self.blob_directory, f"{digest}.pdb.gz")
+
+    def __contains__(self, pdb_id: str) -> bool:
+        pdb_id = pdb_id.upper()
+        with self._lock:
+            if pdb_id in self._memory:
+                return True
+        try:
+            with open(self._reference_path(pdb_id)) as reference_file:
+                return os.path.exists(self._blob_path(reference_file.read().strip()))
+        except OSError:
+            return False
+
+    def get(self, pdb_id: str) -> Optional[bytes]:
+        """
+        Look up a compressed structure.
+        :param pdb_id: The PDB ID of the structure, in any case.
+        :return: The gzip-compressed structure file, or None on a cache miss.
+        """
+        pdb_id = pdb_id.upper()
+        with self._lock:
+            if pdb_id in self._memory:
+                self._memory.move_to_end(pdb_id)
+                self.memory_hits += 1
+                return self._memory[pdb_id]
+
+        try:
+            with open(self._reference_path(pdb_id)) as reference_file:
+                blob_path = self._blob_path(reference_file.read().strip())
+            with open(blob_path, "rb") as blob_file:
+                data = blob_file.read()
+            # The modification time of a file is its last use, for the disk LRU.
+            os.utime(blob_path)
+        except OSError:
+            with self._lock:
+                self.misses += 1
+            return None
+
+        with self._lock:
+            self.disk_hits += 1
+            self._remember(pdb_id, data)
+        return data
+
+    def put(self, pdb_id: str, data: bytes) -> None:
+        """
+        Add a compressed structure to both cache tiers.
+        :param pdb_id: The PDB ID of the structure, in any case.
+        :param data: The gzip-compressed structure file.
+        :return: None.
+        """
+        pdb_id = pdb_id.upper()
+        digest = hashlib.sha256(data).hexdigest()
+        blob_path = self._blob_path(digest)
+        if not os.path.exists(blob_path):
+            with open(f"{blob_path}.{threading.get_ident()}.tmp", "wb") as blob_file:
+                blob_file.write(data)
+            os.replace(f"{blob_path}.{threading.get_ident()}.tmp", blob_path)
+            with self._lock:
+                self._disk_bytes += len(data)
+        reference_path = self._reference_path(pdb_id)
+        with open(f"{reference_path}.{threading.get_ident()}.tmp", "w") as reference_file:
+            reference_file.write(digest)
+        os.replace(f"{reference_path}.{threading.get_ident()}.tmp", reference_path)
+
+        with self._lock:
+            self._remember(pdb_id, data)
+            if self._disk_bytes > self.disk_budget:
+                self._evict_disk()
+
+    def _remember(self, pdb_id: str, data: bytes) -> None:
+        """
+        Add a structure to the memory tier, evicting the least recently used ones over budget. Requires the lock.
+        """
+        if pdb_id in self._memory:
+            self._memory_bytes -= len(self._memory.pop(pdb_id))
+        if len(data) > self.memory_budget:
+            return
+        self._memory[pdb_id] = data
+        self._memory_bytes += len(data)
+        while self._memory_bytes > self.memory_budget:
+            self._memory_bytes -= len(self._memory.popitem(last=False)[1])
+
+    def _evict_disk(self) -> None:
+        """
+        Delete the least recently used files until the disk tier is back under 90% of its budget. Requires the lock.
+        References to deleted files are left in place and count as misses.
+        """
+        blobs = sorted((entry for entry in os.scandir(self.blob_directory) if entry.name.endswith(".pdb.gz")),
+                       key=lambda entry: entry.stat().st_mtime)
+        self._disk_bytes = sum(entry.stat().st_size for entry in blobs)
+        for blob in blobs:
+            if self._disk_bytes <= 0.9 * self.disk_budget:
+                break
+            size = blob.stat().st_size
+            try:
+                os.remove(blob.path)
+            except FileNotFoundError:
+                pass
+            self._disk_bytes -= size
+
+    def stats(self) -> dict[str, int]:
+        """
+        Get the cache counters.
+        :return: The hit and miss counts and the bytes used by each tier.
+        """
+        with self._lock:
+            return {
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "memory_bytes": self._memory_bytes,
+                "disk_bytes": self._disk_bytes
+            }
@@ -1,9 +1,20 @@
+from functools import partial
+
 import altair as alt
 import pandas as pd
 import streamlit as st
 
+from data.composition import read_composition
+from data.dataset import HPADataset, build_dataset
+from data.filter_cache import FilterCache
+from data.preparation import hpa_url, protein_class_priority
+from data.refresh import DatasetRefresher, affected_filters, changed_accessions, refresh_source
+from data.sequence_store import SequenceStore
+from data.snapshot import prepare_source, read_snapshot, read_snapshot_metadata, write_snapshot
 from views.cancer_view import generate_cancer_view
 from views.chromosome_view import generate_chromosome_view
+from views.protein_sequence_view import load_protein_sequence, load_sequence_store
+from views.protein_structure_view import load_structure_cache
 from views.protein_view import generate_protein_view
 
 
@@ -13,37 +24,6 @@ site_configuration = {
     "layout": "wide"
 }
 
-# Prioritized list of protein classes.
-# Proteins that belong to multiple classes will have
-# their "primary protein class" be the one that appears closest to the top of the list.
-protein_class_priority = [
-    "Enzymes",
-    "Transporters",
-    "Transcription factors",
-    "Plasma proteins",
-    "Ribosomal proteins",
-    "Metabolic proteins",
-    "G-protein coupled receptors",
-    "Voltage-gated ion channels",
-    "Immunoglobulin genes",
-    "T-cell receptor genes",
-    "Nuclear receptors",
-    "Disease related genes",
-    "Human disease related genes",
-    "Cancer-related genes",
-    "Potential drug targets",
-    "FDA approved drug targets",
-    "RAS pathway related proteins",
-    "CD markers",
-    "Candidate cardiovascular disease genes",
-    "Blood group antigen proteins",
-    "RNA polymerase related proteins",
-    "Citric acid cycle related proteins",
-    "Predicted intracellular proteins",
-    "Predicted membrane proteins",
-    "Predicted secreted proteins"
-]
-
 #color hex codes retrieved from category10 color scheme
 color_scale = {k: v for k, v in zip(protein_class_priority, 
                       ['#1f77b4', '#ff7f0e', '#2ca02c', '#d62728', 
@@ -58,52 +38,64 @@ with open("stylesheet.css") as stylesheet:
     site_style = f"<style>{stylesheet.read()}</style>"
 
 
-def generate_prognostic_data(row: pd.Series, prognostic_type: str) -> str:
+def load_data() -> pd.DataFrame:
     """
-    Generate a prognostics value for a given protein.
-    :param row: A Human Protein Atlas entry. Must contain prognostics information in different cancer columns.
-    :param prognostic_type: one of "favorable" or "unfavorable".
-    :return: A comma-separated string containing all the cancer types for
-    which the protein has a prognostic_type prognostic.
+    Load the Human Protein Atlas (HPA) DataFrame and prepare the data.
+    Reads the local snapshot built by `python -m data.snapshot`, and only falls back to downloading
+    and preparing the full HPA file when no snapshot exists. Not cached itself, since only load_dataset_refresher
+    calls it: caching it with st.cache_data would return a separate copy of the DataFrame to every session.
+    :return: the tidy DataFrame containing HPA data
     """
-    prognostic_fields = row[pd.Series(row.index).apply(lambda x: "Pathology prognostics" in x).values]
-    prognostics_row = row[prognostic_fields.index]
-    prognostics = prognostics_row[prognostics_row.apply(lambda x: prognostic_type in str(x).lower().split())].index
-    return ",".join(map(lambda x: x.split("-")[1].strip(), prognostics))
+    data = read_snapshot()
+    if data is None:
+        data, metadata = prepare_source(hpa_url)
+        try:
+            write_snapshot(data, metadata)
+        except OSError:
+            pass
+
+    return data
 
 
-def prioritize_protein_class(protein_classes: str, priority_list: list[str] = None) -> list[str]:
+@st.cache_resource
+def load_filter_cache() -> FilterCache:
     """
-    Get a list of prioritized protein classes from a comma-separated string of protein classes.
-    :param protein_classes: Protein classes in a comma-separated format.
-    :param priority_list: list of prioritized protein classes.
-    :return: The primary protein class as a string.
+    Create the filter result cache once per process, so that all sessions share it.
+    :return: The filter cache.
     """
+    return FilterCache()
 
-    if priority_list is None:
-        priority_list = protein_class_priority
 
-    class_list = [x.strip() for x in protein_classes.split(",")]
-    prioritized_protein_classes = [x for x in priority_list if x in class_list]
-    if prioritized_protein_classes:
-        return prioritized_protein_classes
-    return class_list
+def invalidate_changed_proteins(filter_cache: FilterCache, sequence_store: SequenceStore, diff: pd.DataFrame,
+                                old_dataset: HPADataset, new_dataset: HPADataset) -> None:
+    """
+    Drop the cached results that depend on the genes changed by a data refresh.
+    Filter results are kept for the cancer types and prognoses without changed genes, except composition charts,
+    which all compare with the composition of all proteins. Sequences of changed proteins are fetched again, and with
+    them their structure search results, which are keyed on the sequence.
+    Structure files are keyed on PDB IDs, independently of the HPA data, and are kept.
+    """
+    affected = affected_filters(diff, old_dataset, new_dataset)
+    filter_cache.migrate(new_dataset.version, keep=lambda key: (key[1], key[2]) not in affected
+                         and (diff.empty or key[0] != "composition"))
+    if sequence_store.discard(changed_accessions(diff, old_dataset, new_dataset)):
+        load_protein_sequence.clear()
 
 
-@st.cache_data
-def load_data() -> pd.DataFrame:
+@st.cache_resource
+def load_dataset_refresher() -> DatasetRefresher:
     """
-    Load the Human Protein Atlas (HPA) DataFrame and prepare the data.
-    :return: the tidy DataFrame containing HPA data
+    Build the indexes over the HPA data once per process, so that all sessions share them, and start checking
+    for new HPA releases in the background.
+    :return: The refresher holding the current dataset.
     """
-    data = pd.read_csv("https://www.proteinatlas.org/download/proteinatlas.tsv.zip", compression="zip", sep="\t")
-    data["Favorable prognostics"] = data.apply(lambda row: generate_prognostic_data(row, prognostic_type="favorable"), axis=1)
-    data["Unfavorable prognostics"] = data.apply(lambda row: generate_prognostic_data(row, prognostic_type="unfavorable"), axis=1)
-    data.dropna(subset=["Uniprot"], inplace=True)
-    data["Prioritized Protein Class"] = data["Protein class"].apply(prioritize_protein_class)
-    data.drop(data[(data["Chromosome"] == "MT") | (data["Chromosome"] == "Unmapped")].index, inplace=True)
-    
-    return data
+    dataset = build_dataset(load_data(), read_composition())
+    metadata = read_snapshot_metadata() or {}
+    refresher = DatasetRefresher(dataset, source=refresh_source or metadata.get("source", hpa_url),
+                                 validators=metadata.get("validators"))
+    refresher.add_listener(partial(invalidate_changed_proteins, load_filter_cache(), load_sequence_store()))
+    refresher.start()
+    return refresher
 
 
 def main():
@@ -115,23 +107,19 @@ def main():
 
     st.title("GCapricorn")
 
-    data = load_data()
-    st.session_state["unfiltered_data"] = data
-    st.session_state["data"] = data
+    # Sessions only hold a reference to the shared dataset, read once per run so that a refresh swapping
+    # in a new dataset does not change it halfway through the run.
+    dataset = load_dataset_refresher().dataset
+    st.session_state["dataset"] = dataset
+    st.session_state["filter_cache"] = load_filter_cache()
 
     st.session_state["color_scale"] = color_scale
 
-    protein_classes = [x.split(", ") for x in data["Protein class"]]
-    protein_classes = [item for sublist in protein_classes for item in sublist]
-    protein_classes = list(set(protein_classes))
-
     left, middle, right = st.columns(3)
-    protein_selection = middle.multiselect(label="Select Protein Classes", options=protein_classes,
+    protein_selection = middle.multiselect(label="Select Protein Classes", options=dataset.protein_class_vocabulary,
                                           default=["Enzymes", "Transporters", "Transcription factors"])
     st.session_state["protein_selection"] = protein_selection
-    cancer_types = map(lambda x: x.split("-")[1].strip(),
-                       filter(lambda x: "Pathology prognostics" in x, data.columns))
-    cancer_selection = left.selectbox(label="Select Cancer Type", options=cancer_types, index=0)
+    cancer_selection = left.selectbox(label="Select Cancer Type", options=dataset.cancer_types, index=0)
     st.session_state["cancer_selection"] = cancer_selection
 
     prognosis_selection = right.selectbox(label = "Select Prognosis", options = ["Favorable", "Unfavorable"])
@@ -151,6 +139,18 @@ def main():
     with view3:
         generate_protein_view()
 
+    # Counters of the structure cache shared by all sessions of this process, read after the views used it.
+    with st.sidebar.expander("Structure cache"):
+        structure_cache_stats = load_structure_cache().stats()
+        structure_cache_hits = structure_cache_stats["memory_hits"] + structure_cache_stats["disk_hits"]
+        structure_cache_lookups = structure_cache_hits + structure_cache_stats["misses"]
+        st.metric("Hit rate", f"{structure_cache_hits / structure_cache_lookups:.0%}" if structure_cache_lookups
+                  else "-")
+        st.write(f"{structure_cache_stats['memory_hits']} memory hits, {structure_cache_stats['disk_hits']} disk hits, "
+                 f"{structure_cache_stats['misses']} misses")
+        st.write(f"{structure_cache_stats['memory_bytes'] / 1024 ** 2:.1f} MiB in memory, "
+                 f"{structure_cache_stats['disk_bytes'] / 1024 ** 2:.1f} MiB on disk")
+
 
 if __name__ == "__main__":
     main()
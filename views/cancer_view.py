@@ -2,47 +2,147 @@ import altair as alt
 import streamlit as st
 import pandas as pd
 
+from data.aggregates import class_counts
+from data.composition import amino_acids, mean_composition
+from data.dataset import HPADataset
+from data.filter_cache import filter_key
+from data.expression import top_expressed_genes
+from data.filters import filtered_proteins
+from views.chart_specs import compile_chart, display_chart
+from views.protein_sequence_view import amino_acid_info
 
-def generate_cancer_view() -> None:
-    st.header("Cancer-related Protein Statistics")
-    
-    df = st.session_state["data"]
-    cancer_selection = st.session_state["cancer_selection"]
-    prognosis_selection = st.session_state["prognosis_selection"]
-    color_scale = st.session_state["color_scale"]
 
-    df2 = df[(df[f"{prognosis_selection} prognostics"].apply(lambda x: cancer_selection in x))]
-
-    df2["Protein class"] = df["Protein class"].apply(lambda x: [item.strip() for item in x.split(",")])
-    df2 = df2.explode("Protein class")
-    
-    protein_selection = st.session_state["protein_selection"]
+def build_cancer_chart(dataset: HPADataset, cancer_selection: str, prognosis_selection: str,
+                       protein_selection: list[str], color_scale: dict[str, str]) -> alt.Chart:
+    """
+    Generates the chart of protein counts per chromosome and protein class.
+    :param dataset: The HPA dataset.
+    :param cancer_selection: The selected cancer type.
+    :param prognosis_selection: The selected prognosis.
+    :param protein_selection: The protein classes to display.
+    :param color_scale: Mapping of protein classes to colors.
+    :return: A Chart object ready to be displayed.
+    """
+    counts = class_counts(dataset.class_count_cube, cancer_selection, prognosis_selection, protein_selection)
+    filtered_color_scale = {k: v for k, v in color_scale.items() if k in counts["Protein class"].unique()}
 
-    if not protein_selection:
-        st.warning("No protein classes selected. Displaying only broad-level protein classes.")
-        df3 = df2[df2["Protein class"].apply(
-            lambda x: any(protein_class in x for protein_class in ["Enzymes", "Transporters", "Transcription factors"])
-        )]
-        filtered_color_scale = {k: v for k, v in color_scale.items() if k in ["Enzymes", "Transporters", "Transcription factors"]}
-    else:
-        df3 = df2[df2["Protein class"].apply(
-            lambda x: any(protein_class in x for protein_class in protein_selection)
-        )]
-        filtered_color_scale = {k: v for k, v in color_scale.items() if k in df3["Protein class"].unique()}
-   
     chromosomes = [str(x) for x in range(1, 23)] + ["X"]
 
     protein_legend_selector = alt.selection_multi(fields=["Protein class"], bind="legend")
 
-    chart = alt.Chart(df3).mark_bar().encode(
+    chart = alt.Chart(counts).mark_bar().encode(
         x=alt.X('Protein class:N', title=None, axis=alt.Axis(tickCount=26, grid=False, labels=False), 
                 sort = chromosomes),
-        y=alt.Y('count(Gene):Q', axis= alt.Axis(title= "Gene Count")),
+        y=alt.Y('Gene count:Q', axis= alt.Axis(title= "Gene Count")),
         color=alt.Color('Protein class:N', scale=alt.Scale(domain=list(filtered_color_scale.keys()), range=list(filtered_color_scale.values()))),
         column=alt.Column('Chromosome:O', sort = [str(x) for x in range(1, 23)] + ["X"], spacing=13,
                           header=alt.Header(titleOrient='bottom', labelOrient='bottom')),
         opacity=alt.condition(protein_legend_selector, alt.value(1), alt.value(0.2)),
-        tooltip=["Chromosome", "Protein class", "count(Gene)"]
+        tooltip=["Chromosome", "Protein class", "Gene count"]
     ).add_selection(protein_legend_selector).properties(width=16).configure_legend(orient='bottom')
 
-    st.altair_chart(chart, use_container_width=False)
+    return chart
+
+
+def build_composition_chart(dataset: HPADataset, cancer_selection: str, prognosis_selection: str,
+                            protein_selection: list[str]) -> alt.Chart:
+    """
+    Generates the chart comparing the mean amino acid composition of the filtered proteins with all proteins.
+    :param dataset: The HPA dataset, with its amino acid composition matrix.
+    :param cancer_selection: The selected cancer type.
+    :param prognosis_selection: The selected prognosis.
+    :param protein_selection: The protein classes to keep. All proteins are kept if empty.
+    :return: A Chart object ready to be displayed.
+    """
+    rows = filtered_proteins(dataset, cancer_selection, prognosis_selection, protein_selection)
+    filtered, filtered_count = mean_composition(dataset.composition[rows])
+    background, background_count = mean_composition(dataset.composition)
+
+    composition = pd.merge(pd.DataFrame({"one_letter_code": amino_acids, "Filtered": filtered, "All": background}),
+                           amino_acid_info, on="one_letter_code")
+    tooltip = [alt.Tooltip("full_name:N", title="Amino acid"),
+               alt.Tooltip("Filtered:Q", title="Filtered proteins", format=".2%"),
+               alt.Tooltip("All:Q", title="All proteins", format=".2%")]
+    bars = alt.Chart(composition).mark_bar(color="steelblue").encode(
+        x=alt.X("three_letter_code:N", sort=amino_acid_info["three_letter_code"].tolist(), title="Amino Acid Type"),
+        y=alt.Y("Filtered:Q", axis=alt.Axis(format="%"), title="Mean frequency"),
+        tooltip=tooltip
+    )
+    background_ticks = alt.Chart(composition).mark_tick(color="black", thickness=2).encode(
+        x=alt.X("three_letter_code:N", sort=amino_acid_info["three_letter_code"].tolist()),
+        y=alt.Y("All:Q"),
+        tooltip=tooltip
+    )
+    return (bars + background_ticks).properties(
+        title=f"Amino acid composition of {filtered_count} filtered proteins (bars) "
+              f"vs. all {background_count} proteins (ticks)"
+    )
+
+
+def build_top_expressed_genes(dataset: HPADataset, cancer_selection: str, prognosis_selection: str,
+                              protein_selection: list[str], by: str, label: str, n: int = 10) -> pd.DataFrame:
+    """
+    Find the filtered genes with the highest expression in a cell type or tissue.
+    :param dataset: The HPA dataset.
+    :param cancer_selection: The selected cancer type.
+    :param prognosis_selection: The selected prognosis.
+    :param protein_selection: The protein classes to keep. All proteins are kept if empty.
+    :param by: One of {"cell", "tissue"}.
+    :param label: The cell type or tissue.
+    :param n: Number of genes to return.
+    :return: A DataFrame with the "Gene", "Uniprot" and "nTPM" columns, sorted by decreasing expression.
+    """
+    rows = filtered_proteins(dataset, cancer_selection, prognosis_selection, protein_selection)
+    top_genes = top_expressed_genes(dataset.expression[by], label, rows, n)
+    return dataset.data.iloc[top_genes["row"]][["Gene", "Uniprot"]].astype(str).assign(
+        nTPM=top_genes["TPM"].to_numpy()
+    ).reset_index(drop=True)
+
+
+def generate_cancer_view() -> None:
+    st.header("Cancer-related Protein Statistics")
+    
+    dataset = st.session_state["dataset"]
+    filter_cache = st.session_state["filter_cache"]
+    cancer_selection = st.session_state["cancer_selection"]
+    prognosis_selection = st.session_state["prognosis_selection"]
+    color_scale = st.session_state["color_scale"]
+
+    protein_selection = st.session_state["protein_selection"]
+
+    if not protein_selection:
+        st.warning("No protein classes selected. Displaying only broad-level protein classes.")
+        protein_selection = ["Enzymes", "Transporters", "Transcription factors"]
+
+    # Charts are cached compiled, so reruns only send the cached spec and Arrow tables.
+    chart = filter_cache.get(
+        dataset.version, filter_key("cancer", cancer_selection, prognosis_selection, protein_selection),
+        lambda: compile_chart(build_cancer_chart(dataset, cancer_selection, prognosis_selection, protein_selection,
+                                                 color_scale))
+    )
+    display_chart(chart, use_container_width=False)
+
+    # Only available once the composition matrix was built with `python -m data.composition`.
+    if dataset.composition is not None:
+        composition_chart = filter_cache.get(
+            dataset.version, filter_key("composition", cancer_selection, prognosis_selection, protein_selection),
+            lambda: compile_chart(build_composition_chart(dataset, cancer_selection, prognosis_selection,
+                                                          protein_selection))
+        )
+        display_chart(composition_chart, use_container_width=True)
+
+    st.subheader("Top expressed genes")
+    by_col, label_col = st.columns([1, 2])
+    by = by_col.radio("Expression in", options=["tissue", "cell"], horizontal=True,
+                      format_func=lambda x: {"tissue": "Tissue", "cell": "Cell type"}[x])
+    labels = dataset.expression[by].labels
+    if len(labels) == 0:
+        st.write("No expression data available.")
+        return
+    label = label_col.selectbox("Tissue" if by == "tissue" else "Cell type", options=labels)
+    top_genes = filter_cache.get(
+        dataset.version,
+        filter_key("expression", cancer_selection, prognosis_selection, protein_selection, by, label),
+        lambda: build_top_expressed_genes(dataset, cancer_selection, prognosis_selection, protein_selection, by, label)
+    )
+    st.dataframe(top_genes, use_container_width=True)
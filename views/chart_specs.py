@@ -0,0 +1,79 @@
+from typing import Any, NamedTuple, Optional
+
+import altair as alt
+import pandas as pd
+import pyarrow as pa
+import streamlit as st
+from altair.utils.schemapi import Undefined
+
+
+class ChartSpec(NamedTuple):
+    """
+    A compiled Vega-Lite spec whose data is referenced by name, and the named datasets as Arrow tables.
+    """
+    spec: dict[str, Any]
+    datasets: dict[str, pa.Table]
+
+
+def arrow_table(data: pd.DataFrame) -> pa.Table:
+    """
+    Convert the data of a chart to an Arrow table.
+    :param data: The data of the chart.
+    :return: The Arrow table. Categorical columns only keep their used categories, since Arrow sends the whole
+    dictionary of categories of a column, e.g. every protein class of the HPA data for a handful of genes.
+    """
+    categorical_columns = data.select_dtypes("category").columns
+    data = data.assign(**{column: data[column].cat.remove_unused_categories() for column in categorical_columns})
+    return pa.Table.from_pandas(data, preserve_index=False)
+
+
+def name_datasets(chart: alt.TopLevelMixin, data: Optional[pd.DataFrame],
+                  datasets: dict[int, tuple[str, pd.DataFrame]]) -> alt.TopLevelMixin:
+    """
+    Replace the DataFrames of a chart and its sub-charts by references to named datasets, without changing their
+    encodings. Encoding types left out of the shorthands are inferred from the data as Altair does, so that the
+    DataFrames never go through the data transformers, which are global and switched by st.altair_chart.
+    :param chart: The Altair chart.
+    :param data: The data inherited from the parent chart, if any.
+    :param datasets: The named datasets, by id of their DataFrame. Charts sharing a DataFrame share a dataset.
+    :return: A copy of the chart.
+    """
+    chart = chart.copy(deep=False)
+    if isinstance(chart.data, pd.DataFrame):
+        data = chart.data
+        if id(data) not in datasets:
+            datasets[id(data)] = (f"data_{len(datasets)}", data)
+        chart.data = alt.NamedData(name=datasets[id(data)][0])
+    if data is not None and getattr(chart, "encoding", Undefined) is not Undefined:
+        chart.encoding = chart.encoding.to_dict(validate=False, context={"data": data})
+    for attribute in ["layer", "hconcat", "vconcat", "concat"]:
+        if getattr(chart, attribute, Undefined) is not Undefined:
+            setattr(chart, attribute, [name_datasets(sub_chart, data, datasets) for sub_chart in chart[attribute]])
+    if isinstance(getattr(chart, "spec", Undefined), alt.TopLevelMixin):
+        chart.spec = name_datasets(chart.spec, data, datasets)
+    return chart
+
+
+def compile_chart(chart: alt.TopLevelMixin) -> ChartSpec:
+    """
+    Compile an Altair chart once, so that displaying it again neither validates nor serializes the chart.
+    The data is left out of the spec and converted to Arrow tables, which Streamlit sends as they are.
+    :param chart: The Altair chart.
+    :return: The compiled chart.
+    """
+    datasets: dict[int, tuple[str, pd.DataFrame]] = {}
+    spec = name_datasets(chart, None, datasets).to_dict()
+    return ChartSpec(
+        spec=spec,
+        datasets={name: arrow_table(data) for name, data in datasets.values()}
+    )
+
+
+def display_chart(chart: ChartSpec, use_container_width: bool = False) -> None:
+    """
+    Display a compiled chart.
+    :param chart: The compiled chart.
+    :param use_container_width: Whether to set the chart width to the column width.
+    :return: None.
+    """
+    st.vega_lite_chart(dict(chart.spec, datasets=chart.datasets), use_container_width=use_container_width)
@@ -1,75 +1,96 @@
+from typing import Optional
+
 import pandas as pd
 import streamlit as st
 import altair as alt
 
+from data.dataset import HPADataset
+from data.filter_cache import filter_key
+from data.filters import region_proteins
+from data.intervals import chromosome_extent, density_bin_size, gene_density
+from views.chart_specs import ChartSpec, compile_chart, display_chart
+
+
+# Maximum number of genes in the selected region for which individual genes are drawn.
+# Larger regions are only shown as gene density, which bounds the size of the chart.
+detail_gene_limit = 500
+
 
-@st.cache_data
-def build_chromosome_chart(chromosome_proteins: pd.DataFrame) -> alt.Chart:
+def build_chromosome_chart(gene_density: pd.DataFrame, color_scale: dict[str, str],
+                           chromosome_proteins: Optional[pd.DataFrame] = None) -> alt.Chart:
     """
     Generates the chromosome Altair chart.
-    :param chromosome_proteins: DataFrame containing chromosome/protein information.
+    :param gene_density: DataFrame containing gene counts per chromosomal bin and primary protein class.
+    :param color_scale: Mapping of protein classes to colors.
+    :param chromosome_proteins: DataFrame containing chromosome/protein information, or None to display the gene
+    density instead of individual genes in the detailed view.
     :return: A Chart object ready to be displayed.
     """
-    color_scale = st.session_state["color_scale"]
-    filtered_color_scale = {k: v for k, v in color_scale.items() if k in chromosome_proteins["Primary Protein Class"].unique()}
+    filtered_color_scale = {k: v for k, v in color_scale.items() if k in gene_density["Primary Protein Class"].unique()}
 
     brush = alt.selection(type="interval", encodings=["x"])
     protein_legend_selector = alt.selection_multi(fields=["Primary Protein Class"], bind="legend")
 
-    top_line = alt.Chart(chromosome_proteins).mark_line(size=2).encode(
-        x=alt.X("Start Position:Q", scale=alt.Scale(domain=brush.ref())),
-        tooltip=["Gene", "Start Position", "End Position"],
-        color=alt.value("black")
-    )
-
-    gene_boxes = alt.Chart(chromosome_proteins).mark_square(size=500).encode(
-        x=alt.X("Start Position:Q", scale=alt.Scale(domain=brush.ref()), title="Chromosomal Position"),
-        x2=alt.X2("End Position:Q"),
-        tooltip=["Gene", "Gene synonym", "Protein class", "Start Position", "End Position"],
-        opacity=alt.condition(protein_legend_selector, alt.value(0.6), alt.value(0.2)),
-        color=alt.Color("Primary Protein Class:N", scale=alt.Scale(domain=list(filtered_color_scale.keys()),
-                                                                   range=list(filtered_color_scale.values())))
-    ).add_selection(protein_legend_selector)
-    
-    gene_box_names = alt.Chart(chromosome_proteins).mark_text(
-        align="center", 
-        baseline="middle", 
-        fontWeight="bold",
-        font="monospace",
-        dy=-20,
-        dx=-30
-    ).encode(
-        x=alt.X("Start Position:Q", scale=alt.Scale(domain=brush.ref()), title="Chromosomal Position"),
-        x2=alt.X2("End Position:Q"),
-        text="Gene",
-        color=alt.Color("Primary Protein Class:N", scale=alt.Scale(domain=list(filtered_color_scale.keys()),
-                                                                   range=list(filtered_color_scale.values()))),
-        angle=alt.value(45)
-    )
-
-    gene_details = gene_boxes + gene_box_names
-
-    detailed_view = (top_line + gene_details).properties(
+    if chromosome_proteins is not None:
+        top_line = alt.Chart(chromosome_proteins).mark_line(size=2).encode(
+            x=alt.X("Start Position:Q", scale=alt.Scale(domain=brush.ref())),
+            tooltip=["Gene", "Start Position", "End Position"],
+            color=alt.value("black")
+        )
+
+        gene_boxes = alt.Chart(chromosome_proteins).mark_square(size=500).encode(
+            x=alt.X("Start Position:Q", scale=alt.Scale(domain=brush.ref()), title="Chromosomal Position"),
+            x2=alt.X2("End Position:Q"),
+            tooltip=["Gene", "Gene synonym", "Protein class", "Start Position", "End Position"],
+            opacity=alt.condition(protein_legend_selector, alt.value(0.6), alt.value(0.2)),
+            color=alt.Color("Primary Protein Class:N", scale=alt.Scale(domain=list(filtered_color_scale.keys()),
+                                                                       range=list(filtered_color_scale.values())))
+        ).add_selection(protein_legend_selector)
+
+        gene_box_names = alt.Chart(chromosome_proteins).mark_text(
+            align="center",
+            baseline="middle",
+            fontWeight="bold",
+            font="monospace",
+            dy=-20,
+            dx=-30
+        ).encode(
+            x=alt.X("Start Position:Q", scale=alt.Scale(domain=brush.ref()), title="Chromosomal Position"),
+            x2=alt.X2("End Position:Q"),
+            text="Gene",
+            color=alt.Color("Primary Protein Class:N", scale=alt.Scale(domain=list(filtered_color_scale.keys()),
+                                                                       range=list(filtered_color_scale.values()))),
+            angle=alt.value(45)
+        )
+
+        gene_details = top_line + gene_boxes + gene_box_names
+    else:
+        gene_details = alt.Chart(gene_density).mark_bar().encode(
+            x=alt.X("Bin start:Q", scale=alt.Scale(domain=brush.ref()), title="Chromosomal Position"),
+            x2=alt.X2("Bin end:Q"),
+            y=alt.Y("Gene count:Q", title="Gene Count"),
+            tooltip=["Primary Protein Class", "Bin start", "Bin end", "Gene count"],
+            opacity=alt.condition(protein_legend_selector, alt.value(0.6), alt.value(0.2)),
+            color=alt.Color("Primary Protein Class:N", scale=alt.Scale(domain=list(filtered_color_scale.keys()),
+                                                                       range=list(filtered_color_scale.values())))
+        ).add_selection(protein_legend_selector)
+
+    detailed_view = gene_details.properties(
         width=500,
         height=150
     )
 
-    bottom_line = alt.Chart(chromosome_proteins).mark_line(size=2).encode(
-        x=alt.X("Start Position:Q"),
-        tooltip=["Gene", "Start Position", "End Position"],
-        color=alt.value("black")
-    )
-
-    gene_overview = alt.Chart(chromosome_proteins).mark_circle(size=50).encode(
-        x=alt.X("Start Position:Q", title="Drag to select chromosomal region, scroll to zoom in/out"),
-        x2=alt.X2("End Position:Q"),
-        tooltip=["Gene", "Start Position", "End Position"],
+    gene_overview = alt.Chart(gene_density).mark_bar().encode(
+        x=alt.X("Bin start:Q", title="Drag to select chromosomal region, scroll to zoom in/out"),
+        x2=alt.X2("Bin end:Q"),
+        y=alt.Y("Gene count:Q", title=None, axis=None),
+        tooltip=["Primary Protein Class", "Bin start", "Bin end", "Gene count"],
         opacity=alt.condition(protein_legend_selector, alt.value(1), alt.value(0.2)),
         color=alt.Color("Primary Protein Class:N", scale=alt.Scale(domain=list(filtered_color_scale.keys()),
                                                                    range=list(filtered_color_scale.values())))
     )
 
-    general_view = (bottom_line + gene_overview).properties(
+    general_view = gene_overview.properties(
         width=500,
         height=50,
     ).add_selection(brush)
@@ -77,6 +98,37 @@ def build_chromosome_chart(chromosome_proteins: pd.DataFrame) -> alt.Chart:
     return detailed_view & general_view
 
 
+def build_chromosome_view_data(dataset: HPADataset, cancer_selection: str, prognosis_selection: str,
+                               protein_selection: list[str], chromosome: str,
+                               start: int, end: int, color_scale: dict[str, str]) -> tuple[int, alt.Chart]:
+    """
+    Filter the proteins of a chromosomal region and build their chart.
+    :param dataset: The HPA dataset.
+    :param cancer_selection: The selected cancer type.
+    :param prognosis_selection: The selected prognosis.
+    :param protein_selection: The selected protein classes. All proteins are kept if empty.
+    :param chromosome: The selected chromosome.
+    :param start: First position of the selected region.
+    :param end: Position right after the end of the selected region.
+    :param color_scale: Mapping of protein classes to colors.
+    :return: The number of proteins in the region and the chart.
+    """
+    rows, primary_protein_classes = region_proteins(dataset, cancer_selection, prognosis_selection, protein_selection,
+                                                    chromosome, start, end)
+
+    bin_size = density_bin_size(start, end)
+    density = gene_density(dataset.density_bins[bin_size][rows], primary_protein_classes, bin_size)
+
+    chromosome_proteins = None
+    if len(rows) <= detail_gene_limit:
+        chromosome_proteins = dataset.data.iloc[rows][["Gene", "Gene synonym", "Protein class", "Start Position",
+                                                       "End Position"]].assign(
+            **{"Primary Protein Class": primary_protein_classes}
+        )
+
+    return len(rows), build_chromosome_chart(density, color_scale, chromosome_proteins)
+
+
 def generate_chromosome_view() -> None:
     """
     Generates the chromosome view.
@@ -84,31 +136,41 @@ def generate_chromosome_view() -> None:
     """
 
     st.header("Chromosome View")
-    data = st.session_state["data"]
+    dataset = st.session_state["dataset"]
+    filter_cache = st.session_state["filter_cache"]
     protein_selection = st.session_state["protein_selection"]
     cancer_selection = st.session_state["cancer_selection"]
     prognosis_selection = st.session_state["prognosis_selection"]
-
-    data = data[(data[f"{prognosis_selection} prognostics"].apply(lambda x: cancer_selection in x))]
+    color_scale = st.session_state["color_scale"]
 
     chromosome_select = st.selectbox(label="Select available chromosomes",
                                      options=[str(x) for x in range(1, 23)] + ["X"], index=0)
-    chromosome_data = data[data["Chromosome"] == chromosome_select]
+    # Rounded up to the slider step, in megabases.
+    chromosome_end = round(chromosome_extent(dataset.interval_index, chromosome_select) / 1e6 + 0.05, 1)
+    region_start, region_end = st.slider("Chromosomal region (Mb)", min_value=0.0, max_value=chromosome_end,
+                                         value=(0.0, chromosome_end), step=0.1)
 
-    if not protein_selection:
-        st.warning("No protein classes selected. Displaying all proteins in the chromosome.")
-        chromosome_proteins = chromosome_data
-    else:
-        chromosome_proteins = chromosome_data[chromosome_data["Protein class"].apply(
-            lambda x: any(protein_class in x for protein_class in protein_selection)
-        )]
-
-    chromosome_proteins["Start Position"] = chromosome_proteins["Position"].apply(lambda x: x.split('-')[0].strip())
-    chromosome_proteins["End Position"] = chromosome_proteins["Position"].apply(lambda x: x.split('-')[1].strip())
+    start, end = int(region_start * 1e6), int(region_end * 1e6)
 
-    chromosome_proteins["Primary Protein Class"] = chromosome_proteins["Prioritized Protein Class"].apply(
-        lambda x: x[0] if list(filter(lambda y: y in protein_selection, x)) == [] else list(filter(lambda y: y in protein_selection, x))[0]
+    if not protein_selection:
+        st.warning("No protein classes selected. Displaying all proteins in the chromosomal region.")
+
+    def build_compiled_view_data() -> tuple[int, ChartSpec]:
+        protein_count, chart = build_chromosome_view_data(dataset, cancer_selection, prognosis_selection,
+                                                          protein_selection, chromosome_select, start, end,
+                                                          color_scale)
+        return protein_count, compile_chart(chart)
+
+    # Filter results and compiled charts are shared by all sessions with the same selection, so reruns only send
+    # the cached spec and Arrow tables.
+    protein_count, chart = filter_cache.get(
+        dataset.version,
+        filter_key("chromosome", cancer_selection, prognosis_selection, protein_selection, chromosome_select,
+                   start, end),
+        build_compiled_view_data
     )
 
-    chart = build_chromosome_chart(chromosome_proteins)
-    st.altair_chart(chart, use_container_width=True)
+    if protein_count > detail_gene_limit:
+        st.info(f"{protein_count} proteins in the selected region. Narrow the region down to {detail_gene_limit} "
+                f"proteins or fewer to display individual genes.")
+    display_chart(chart, use_container_width=True)
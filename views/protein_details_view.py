@@ -1,46 +1,28 @@
 import operator
 from functools import reduce
-from typing import Optional
 
 import altair as alt
 import pandas as pd
 import streamlit as st
 
-tpm_column_names = {
-    "cell": "RNA single cell type specific nTPM",
-    "tissue": "RNA tissue specific nTPM"
-}
+from data.dataset import HPADataset
+from data.expression import expression_row
+from data.gene_search import uniprot_row
 
 
-@st.cache_data
-def load_protein_tpm(protein_info: pd.Series, by: str = "cell") -> Optional[pd.DataFrame]:
-    """
-    Obtain TPM data from a row of the Human Protein Atlas DataFrame.
-    :param protein_info: The row of the HPA DataFrame as a pandas Series object.
-    :param by: What type of TPM to retrieve. One of {"cell", "tissue"}.
-    :return: A DataFrame with the TPM information per cell or tissue, or None of no information is available.
-    """
-    if pd.isna(protein_info[tpm_column_names[by]]):
-        return None
-    else:
-        values = protein_info[tpm_column_names[by]]
-        values_dict = {x.split(":")[0].strip().title(): float(x.split(":")[1].strip()) for x in values.split(";")}
-        return pd.DataFrame({by: values_dict.keys(), "TPM": values_dict.values()})
-
-
-def generate_protein_details_view(uniprot_id: str, data: pd.DataFrame) -> None:
+def generate_protein_details_view(uniprot_id: str, dataset: HPADataset) -> None:
     """
     Display protein data such as chromosome, gene, disease relatedness and others.
     :param uniprot_id: UniProt ID of the protein in question.
-    :param data: DataFrame from the Human Protein Atlas containing information about the protein.
+    :param dataset: The HPA dataset containing information about the protein.
     :return: None.
     """
 
-    protein_info = data[data["Uniprot"] == uniprot_id]
-    if len(protein_info) == 0:
+    row = uniprot_row(dataset.gene_search, uniprot_id)
+    if row is None:
         st.write(f"No Uniprot found for ID {uniprot_id}")
         return
-    protein_info = protein_info.iloc[0]
+    protein_info = dataset.data.iloc[row]
 
     gene_col, chromosome_col, ensembl_col = st.columns([2, 1, 3])
     gene_col.metric("Gene", protein_info["Gene"])
@@ -85,8 +67,8 @@ def generate_protein_details_view(uniprot_id: str, data: pd.DataFrame) -> None:
             rf"Disease involvement <br> <div class='gc-info-box'><ul>{''.join(diseases)}</ul></div>",
             unsafe_allow_html=True)
 
-    cell_tpm = load_protein_tpm(protein_info, by="cell")
-    tissue_tpm = load_protein_tpm(protein_info, by="tissue")
+    cell_tpm = expression_row(dataset.expression["cell"], row, by="cell")
+    tissue_tpm = expression_row(dataset.expression["tissue"], row, by="tissue")
 
     bar_charts = []
     if cell_tpm is not None:
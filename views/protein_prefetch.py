@@ -0,0 +1,84 @@
+import logging
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+
+import numpy as np
+
+from data.dataset import HPADataset
+from data.filters import filtered_proteins
+from views.protein_sequence_view import fetch_protein_sequence
+from views.protein_structure_view import prefetch_protein_structures, search_protein_structures
+
+logger = logging.getLogger(__name__)
+
+# Number of genes of the current filter whose data is fetched ahead of their selection.
+speculative_prefetch_count = 5
+
+# The selected proteins are fetched on their own pool, so speculative fetches never hold them up.
+protein_prefetch_pool = ThreadPoolExecutor(max_workers=4, thread_name_prefix="protein-prefetch")
+speculative_prefetch_pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix="speculative-prefetch")
+# Prefetches in progress, so that reruns do not queue the same protein again.
+pending_protein_prefetches: dict[str, Future] = {}
+pending_protein_prefetches_lock = threading.Lock()
+
+
+def fetch_protein_data(uniprot_id: str) -> None:
+    """
+    Fetch the sequence of a protein, search its structures and start downloading the best match, filling the
+    sequence store, the structure search cache and the structure cache that the protein view reads from.
+    :param uniprot_id: The UniProt ID of the protein.
+    :return: None.
+    """
+    try:
+        sequence = fetch_protein_sequence(uniprot_id)
+        structures = [pdb_id for pdb_id, score in search_protein_structures(sequence) if score > 0.0]
+        prefetch_protein_structures(structures[:1])
+    except Exception:
+        logger.debug("Prefetch of protein %s failed", uniprot_id, exc_info=True)
+
+
+def prefetch_proteins(uniprot_ids: list[str], speculative: bool = False) -> None:
+    """
+    Start fetching the data of proteins in the background, skipping proteins already being fetched.
+    :param uniprot_ids: The UniProt IDs of the proteins.
+    :param speculative: Whether the proteins are only likely to be selected next.
+    :return: None.
+    """
+    pool = speculative_prefetch_pool if speculative else protein_prefetch_pool
+    with pending_protein_prefetches_lock:
+        for uniprot_id in uniprot_ids:
+            if uniprot_id not in pending_protein_prefetches:
+                prefetch = pool.submit(fetch_protein_data, uniprot_id)
+                pending_protein_prefetches[uniprot_id] = prefetch
+                prefetch.add_done_callback(lambda _, uniprot_id=uniprot_id: finish_protein_prefetch(uniprot_id))
+
+
+def finish_protein_prefetch(uniprot_id: str) -> None:
+    """
+    Forget a finished prefetch. Its results, if any, are in the caches.
+    :param uniprot_id: The UniProt ID of the protein.
+    :return: None.
+    """
+    with pending_protein_prefetches_lock:
+        pending_protein_prefetches.pop(uniprot_id, None)
+
+
+def top_filtered_proteins(dataset: HPADataset, cancer: str, prognosis: str, protein_selection: list[str],
+                          count: int = speculative_prefetch_count) -> list[str]:
+    """
+    Rank the proteins of a filter by their likelihood of being selected next: the number of cancer types for which
+    they are prognostic.
+    :param dataset: The HPA dataset.
+    :param cancer: The cancer type.
+    :param prognosis: One of "Favorable" or "Unfavorable".
+    :param protein_selection: The selected protein classes. All proteins are kept if empty.
+    :param count: Number of proteins to return.
+    :return: The UniProt IDs of the top proteins.
+    """
+    rows = filtered_proteins(dataset, cancer, prognosis, protein_selection)
+    if len(rows) == 0:
+        return []
+    prognostic_counts = np.bincount(np.concatenate(list(dataset.prognostic_index.values())),
+                                    minlength=len(dataset.data))[rows]
+    rows = rows[np.argsort(-prognostic_counts, kind="stable")]
+    return dataset.data["Uniprot"].iloc[rows].dropna().drop_duplicates().head(count).tolist()
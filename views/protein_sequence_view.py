@@ -1,10 +1,13 @@
-from collections import Counter
-
 import altair as alt
+import numpy as np
 import pandas as pd
-import requests
 import streamlit as st
 
+from data.composition import amino_acids, sequence_composition
+from data.gene_search import uniprot_row
+from data.http_client import http_client
+from data.sequence_store import SequenceStore
+
 amino_acid_info = pd.DataFrame({
     "one_letter_code": ["A", "L", "I", "M", "V", "F", "W",
                         "Y", "N", "C", "Q", "S", "T", "D",
@@ -17,30 +20,95 @@ amino_acid_info = pd.DataFrame({
                   "Glutamate", "Arginine", "Histidine", "Lysine", "Glycine", "Proline"],
     "color": ["#C8C8C8", "#0F820F", "#0F820F", "#E6E600", "#0F820F", "#3232AA", "#B45AB4",
               "#3232AA", "#00DCDC", "#E6E600", "#00DCDC", "#FA9600", "#FA9600", "#E60A0A",
-              "#E60A0A", "#145AFF", "#8282D2", "#145AFF", "#EBEBEB", "#DC9682"]
+              "#E60A0A", "#145AFF", "#8282D2", "#145AFF", "#EBEBEB", "#DC9682"],
+    "residue_class": ["Hydrophobic", "Hydrophobic", "Hydrophobic", "Hydrophobic", "Hydrophobic", "Aromatic",
+                      "Aromatic", "Aromatic", "Polar", "Polar", "Polar", "Polar", "Polar", "Acidic",
+                      "Acidic", "Basic", "Basic", "Basic", "Special", "Special"]
+})
+
+# Non-standard and ambiguous one-letter codes that may appear in UniProt sequences.
+nonstandard_amino_acid_info = pd.DataFrame({
+    "one_letter_code": ["U", "O", "B", "Z", "J", "X"],
+    "three_letter_code": ["Sec", "Pyl", "Asx", "Glx", "Xle", "Xaa"],
+    "full_name": ["Selenocysteine", "Pyrrolysine", "Asparagine or aspartate", "Glutamine or glutamate",
+                  "Leucine or isoleucine", "Unknown"],
+    "color": ["#BEA06E", "#BEA06E", "#BEA06E", "#BEA06E", "#BEA06E", "#BEA06E"],
+    "residue_class": ["Other", "Other", "Other", "Other", "Other", "Other"]
 })
 
+residue_info = pd.concat([amino_acid_info, nonstandard_amino_acid_info], ignore_index=True)
+
+# Row of residue_info for every byte value. Characters without an entry are shown as unknown residues ("X").
+residue_codes = np.full(256, residue_info.index[residue_info["one_letter_code"] == "X"][0])
+residue_codes[[ord(x) for x in residue_info["one_letter_code"]]] = residue_info.index
+
+residue_class_colors = {
+    "Hydrophobic": "#0F820F",
+    "Aromatic": "#3232AA",
+    "Polar": "#FA9600",
+    "Acidic": "#E60A0A",
+    "Basic": "#145AFF",
+    "Special": "#DC9682",
+    "Other": "#BEA06E"
+}
+residue_class_codes = pd.Categorical(residue_info["residue_class"], categories=list(residue_class_colors)).codes
+
+# Window sizes of the sequence pyramid levels, in residues.
+pyramid_window_sizes = [10, 100, 1000]
+
+# Maximum number of residues for which individual residues are displayed.
+# Longer sequences and ranges are displayed as windows of the sequence pyramid, which bounds the chart size.
+residue_detail_limit = 1000
+
+
+@st.cache_resource
+def load_sequence_store() -> SequenceStore:
+    """
+    Open the local sequence store, shared by all sessions of this process.
+    :return: The sequence store.
+    """
+    return SequenceStore()
+
+
+def fetch_protein_sequence(protein_id: str) -> str:
+    """
+    Retrieve amino acid sequence in one-letter codes, from the local sequence store if available
+    or else from the UniProt database, storing it locally for later lookups. Safe to call from background threads.
+    :param protein_id: UniProt ID.
+    :return: The protein sequence as a string of amino acids.
+    """
+    sequence_store = load_sequence_store()
+    sequence = sequence_store.get(protein_id)
+    if sequence is None:
+        response = http_client.get(f"https://www.uniprot.org/uniprot/{protein_id}.fasta")
+        # Failed requests raise instead of caching an empty or error page as the sequence.
+        response.raise_for_status()
+        fasta_string: str = response.text
+        sequence = "".join([x.strip() for x in fasta_string.split("\n")[1:]])
+        if sequence:
+            sequence_store.put(protein_id, sequence)
+    return sequence
+
 
 @st.cache_data
 def load_protein_sequence(protein_id: str) -> str:
     """
-    Retrieve amino acid sequence in one-letter codes from the UniProt database.
+    Retrieve amino acid sequence in one-letter codes, see fetch_protein_sequence.
     :param protein_id: UniProt ID.
     :return: The protein sequence as a string of amino acids.
     """
-    fasta_string: str = requests.get(f"https://www.uniprot.org/uniprot/{protein_id}.fasta").text
-    return "".join([x.strip() for x in fasta_string.split("\n")[1:]])
+    return fetch_protein_sequence(protein_id)
 
 
 @st.cache_data
-def generate_amino_acid_counts_chart(seq: str) -> alt.Chart:
+def generate_amino_acid_counts_chart(amino_acid_counts: np.ndarray) -> alt.Chart:
     """
-    Given a protein sequence, build a bar chart displaying amino acid frequency data.
-    :param seq: The sequence of amino acids as one-letter codes.
+    Build a bar chart displaying amino acid frequency data.
+    :param amino_acid_counts: The count of every amino acid of data.composition.amino_acids in the sequence.
     :return: an Altair bar chart displaying amino acid frequencies.
     """
-    amino_acid_counts = Counter(seq)
-    amino_acid_counts = pd.DataFrame({"one_letter_code": amino_acid_counts.keys(), "count": amino_acid_counts.values()})
+    amino_acid_counts = pd.DataFrame({"one_letter_code": amino_acids, "count": amino_acid_counts})
+    amino_acid_counts = amino_acid_counts[amino_acid_counts["count"] > 0]
     amino_acid_table = pd.merge(amino_acid_counts, amino_acid_info, on="one_letter_code")
     amino_acid_chart = alt.Chart(amino_acid_table).mark_bar().encode(
         x=alt.X("three_letter_code", type="nominal", sort="-y", title="Amino Acid Type"),
@@ -53,26 +121,110 @@ def generate_amino_acid_counts_chart(seq: str) -> alt.Chart:
     return amino_acid_chart
 
 
+def build_sequence_table(seq: str) -> pd.DataFrame:
+    """
+    Build a table with one row per residue of a protein sequence.
+    :param seq: The sequence of amino acids as one-letter codes.
+    :return: A DataFrame with the one-letter code, 1-based position, full name, three-letter code and color
+    of every residue.
+    """
+    codes = residue_codes[np.frombuffer(seq.encode("ascii", errors="replace").upper(), dtype=np.uint8)]
+    return pd.DataFrame({
+        "amino_acid": list(seq),
+        "position": np.arange(1, len(seq) + 1),
+        "amino_acid_name": residue_info["full_name"].to_numpy()[codes],
+        "amino_acid_three_letter": residue_info["three_letter_code"].to_numpy()[codes],
+        "color": residue_info["color"].to_numpy()[codes],
+        "empty_string": ""
+    })
+
+
+@st.cache_data
+def build_sequence_pyramid(seq: str) -> dict[int, pd.DataFrame]:
+    """
+    Summarize a protein sequence in windows of increasing size.
+    :param seq: The sequence of amino acids as one-letter codes.
+    :return: A dict mapping each window size in pyramid_window_sizes to a DataFrame with one row per window,
+    containing the 1-based "start" and "end" residue numbers, the "dominant_class" residue class and its "color",
+    and the fraction of residues of each residue class.
+    """
+    classes = residue_class_codes[residue_codes[np.frombuffer(seq.encode("ascii", errors="replace").upper(),
+                                                               dtype=np.uint8)]]
+    pyramid = {}
+    for window_size in pyramid_window_sizes:
+        windows = np.arange(len(seq)) // window_size
+        window_count = -(-len(seq) // window_size)
+        counts = np.bincount(windows * len(residue_class_colors) + classes,
+                             minlength=window_count * len(residue_class_colors))
+        counts = counts.reshape(window_count, len(residue_class_colors))
+        dominant_class = np.array(list(residue_class_colors), dtype=object)[counts.argmax(axis=1)]
+        pyramid[window_size] = pd.DataFrame({
+            "start": np.arange(window_count) * window_size + 1,
+            "end": np.minimum((np.arange(window_count) + 1) * window_size, len(seq)),
+            "dominant_class": dominant_class,
+            "color": pd.Series(dominant_class).map(residue_class_colors).to_numpy(),
+            **{residue_class: counts[:, i] / counts.sum(axis=1) for i, residue_class in enumerate(residue_class_colors)}
+        })
+    return pyramid
+
+
+def pyramid_windows(pyramid: dict[int, pd.DataFrame], start: int, end: int, max_windows: int = 300) -> pd.DataFrame:
+    """
+    Get the windows of the finest pyramid level that covers a range of residues with at most max_windows windows.
+    :param pyramid: The pyramid built by build_sequence_pyramid.
+    :param start: First residue number of the range.
+    :param end: Last residue number of the range.
+    :param max_windows: Maximum number of windows to return, unless even the coarsest level needs more.
+    :return: The windows overlapping the range.
+    """
+    window_size = next((x for x in pyramid_window_sizes if (end - start + 1) / x <= max_windows),
+                       pyramid_window_sizes[-1])
+    windows = pyramid[window_size]
+    return windows[(windows["end"] >= start) & (windows["start"] <= end)]
+
+
+def generate_sequence_overview(windows: pd.DataFrame, selected_range: tuple[int, int]) -> alt.Chart:
+    """
+    Generate a coarse sequence track from windows of the sequence pyramid.
+    :param windows: Windows of the sequence pyramid, as returned by pyramid_windows.
+    :param selected_range: First and last residue numbers of the range to highlight.
+    :return: An Altair Chart with one rectangle per window, colored by its dominant residue class.
+    """
+    tooltip = [alt.Tooltip("start:Q", title="From"), alt.Tooltip("end:Q", title="To"),
+               alt.Tooltip("dominant_class:N", title="Dominant class")] + \
+              [alt.Tooltip(f"{residue_class}:Q", format=".0%") for residue_class in residue_class_colors]
+
+    window_colors = alt.Chart(windows).mark_rect().encode(
+        x=alt.X("start:Q", title="Residue number", scale=alt.Scale(domain=(int(windows["start"].min()),
+                                                                        int(windows["end"].max())))),
+        x2=alt.X2("end:Q"),
+        color=alt.Color("color", type="nominal", scale=None),
+        tooltip=tooltip
+    ).properties(
+        width=600,
+        height=50
+    )
+
+    selection = alt.Chart(pd.DataFrame({"start": [selected_range[0]], "end": [selected_range[1]]})).mark_rect(
+        fill=None, stroke="black", strokeWidth=2
+    ).encode(
+        x="start:Q",
+        x2="end:Q"
+    )
+
+    return (window_colors + selection).configure_axisX(format="d")
+
+
 @st.cache_data
-def generate_sequence_visualization(seq: str) -> alt.Chart:
+def generate_sequence_visualization(seq: str, offset: int = 0) -> alt.Chart:
     """
     Given a protein sequence, generate a protein sequence visualization.
     :param seq: The sequence to visualize.
+    :param offset: Number of residues preceding seq in the full protein sequence, when visualizing a fragment.
     :return: An Altair Chart showing an interactive view of the sequence, allowing users to zoom and pan.
     """
-    sequence_table = pd.DataFrame({"amino_acid": list(seq),
-                                   "position": [x for x in range(len(seq))]})
-    sequence_table["amino_acid_name"] = sequence_table["amino_acid"].apply(
-        lambda x: amino_acid_info[amino_acid_info["one_letter_code"] == x]["full_name"].iloc[0]
-    )
-    sequence_table["amino_acid_three_letter"] = sequence_table["amino_acid"].apply(
-        lambda x: amino_acid_info[amino_acid_info["one_letter_code"] == x]["three_letter_code"].iloc[0]
-    )
-    sequence_table["color"] = sequence_table["amino_acid"].apply(
-        lambda x: amino_acid_info[amino_acid_info["one_letter_code"] == x]["color"].iloc[0]
-    )
-    sequence_table["position"] += 1
-    sequence_table["empty_string"] = ""
+    sequence_table = build_sequence_table(seq)
+    sequence_table["position"] += offset
 
     interval = alt.selection(type="interval", name="interval_select", encodings=["x"], zoom=True)
 
@@ -107,7 +259,7 @@ def generate_sequence_visualization(seq: str) -> alt.Chart:
     )
 
     position_selector = alt.Chart(sequence_table).mark_line(color="black", size=2).encode(
-        x=alt.X("position:Q", title="Drag to select subset of amino acid sequence, scroll to zoom in/out", scale=alt.Scale(domain=(1, len(seq) + 1)))
+        x=alt.X("position:Q", title="Drag to select subset of amino acid sequence, scroll to zoom in/out", scale=alt.Scale(domain=(offset + 1, offset + len(seq) + 1)))
     ).properties(
         width=600,
         height=50
@@ -124,8 +276,27 @@ def generate_protein_sequence_view(uniprot_id: str) -> None:
     """
     seq = load_protein_sequence(uniprot_id)
 
-    sequence_visualization = generate_sequence_visualization(seq)
-    st.altair_chart(sequence_visualization, use_container_width=True)
+    if len(seq) <= residue_detail_limit:
+        sequence_visualization = generate_sequence_visualization(seq)
+        st.altair_chart(sequence_visualization, use_container_width=True)
+    else:
+        start, end = st.slider("Residue range", min_value=1, max_value=len(seq), value=(1, residue_detail_limit))
+        pyramid = build_sequence_pyramid(seq)
+        st.altair_chart(generate_sequence_overview(pyramid_windows(pyramid, 1, len(seq)), (start, end)),
+                        use_container_width=True)
+        if end - start + 1 <= residue_detail_limit:
+            sequence_visualization = generate_sequence_visualization(seq[start - 1:end], offset=start - 1)
+        else:
+            st.info(f"Select a range of {residue_detail_limit} residues or fewer to display individual residues.")
+            sequence_visualization = generate_sequence_overview(pyramid_windows(pyramid, start, end), (start, end))
+        st.altair_chart(sequence_visualization, use_container_width=True)
 
-    amino_acid_chart = generate_amino_acid_counts_chart(seq)
+    # Read the precomputed composition of the protein if available, instead of recounting the sequence.
+    dataset = st.session_state["dataset"]
+    row = uniprot_row(dataset.gene_search, uniprot_id)
+    if dataset.composition is not None and row is not None and dataset.composition[row].any():
+        amino_acid_counts = dataset.composition[row]
+    else:
+        amino_acid_counts = sequence_composition(seq)
+    amino_acid_chart = generate_amino_acid_counts_chart(amino_acid_counts)
     st.altair_chart(amino_acid_chart, use_container_width=True)
@@ -1,25 +1,87 @@
 import gzip
 import json
 import os
-from typing import Optional, Union
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Optional
 
 import py3Dmol
 import requests
 import streamlit as st
 import streamlit.components.v1 as components
 
+from data.filter_cache import FilterCache
+from data.http_client import http_client
+from data.pdb import ParsedStructure, parse_pdb, reduce_structure
+from data.similarity import SimilarityIndex, read_similarity_index, search_similar_sequences
+from data.structure_cache import StructureCache
 from views.protein_sequence_view import load_protein_sequence
 
 
-@st.cache_data
-def load_protein_structures(sequence: str) -> Optional[dict[str, dict[str, Union[str, int]]]]:
+# Number of best-scoring PDB entries offered for a protein.
+structure_search_limit = 25
+# Whether local searches rescore their best candidates with their estimated identity, instead of only ranking them
+# on shared k-mers.
+structure_search_refine = False
+# Number of structures downloaded in the background after the selected one, in ranking order.
+structure_prefetch_count = 3
+# Timeout in seconds of every request to the PDB.
+structure_request_timeout = 30
+# Number of sequences whose structure search results are kept.
+structure_search_cache_entries = 1024
+
+structure_download_pool = ThreadPoolExecutor(max_workers=4, thread_name_prefix="structure-download")
+# Background downloads in progress. Finished downloads are read from the structure cache.
+pending_structure_downloads: dict[str, Future] = {}
+pending_structure_downloads_lock = threading.RLock()
+
+
+@st.cache_resource
+def load_similarity_index() -> Optional[SimilarityIndex]:
+    """
+    Read the local sequence similarity index of PDB structures once per process.
+    :return: The similarity index, or None if it was not built with `python -m data.similarity`.
+    """
+    return read_similarity_index()
+
+
+@st.cache_resource
+def load_structure_search_cache() -> FilterCache:
+    """
+    Open the cache of structure search results, shared by all sessions of this process and filled by prefetches.
+    :return: The structure search cache.
+    """
+    return FilterCache(max_entries=structure_search_cache_entries)
+
+
+def search_protein_structures(sequence: str, top_k: int = structure_search_limit) -> list[tuple[str, float]]:
+    """
+    Search for protein structures matching a protein sequence, or look up the results of an earlier search.
+    Safe to call from background threads.
+    :param sequence: The protein sequence as a string of 1-letter amino acids.
+    :param top_k: Maximum number of PDB entries to return.
+    :return: A list of (PDB ID, score) pairs sorted by decreasing score.
+    """
+    # Results of the local index and of the PDB API differ, so each is cached as its own version.
+    version = "local" if load_similarity_index() is not None else "rcsb"
+    return load_structure_search_cache().get(version, (sequence, top_k),
+                                             lambda: find_protein_structures(sequence, top_k))
+
+
+def find_protein_structures(sequence: str, top_k: int = structure_search_limit) -> list[tuple[str, float]]:
     """
-    Retrieve protein structures from a protein sequence. Uses the PDB API in order to obtain PDB entries that match
-    the provided sequence.
+    Search for protein structures matching a protein sequence, without downloading the structures. Uses the local
+    similarity index if it was built, and otherwise the PDB API.
     :param sequence: The protein sequence as a string of 1-letter amino acids.
-    :return: A dictionary containing the PDB ID as a key another dictionary with PDB structure and score as values.
+    :param top_k: Maximum number of PDB entries to return.
+    :return: A list of (PDB ID, score) pairs sorted by decreasing score.
     The score is a numeric value from 0 to 1 representing the sequence match.
+    :raises requests.RequestException: If the PDB API could not be reached or did not answer with search results.
     """
+    similarity_index = load_similarity_index()
+    if similarity_index is not None:
+        return search_similar_sequences(similarity_index, sequence, top_k, refine=structure_search_refine)
+
     query = {
         "query": {
             "type": "terminal",
@@ -30,32 +92,111 @@ def load_protein_structures(sequence: str) -> Optional[dict[str, dict[str, Union
             }
         },
         "request_options": {
-            "scoring_strategy": "sequence"
+            "scoring_strategy": "sequence",
+            "paginate": {"start": 0, "rows": top_k}
         },
         "return_type": "entry"
     }
 
-    structures = {}
+    response = http_client.get(
+        "https://search.rcsb.org/rcsbsearch/v2/query", params={"json": json.dumps(query, separators=(",", ":"))},
+        timeout=structure_request_timeout
+    )
+    # The search API answers 204 with an empty body when no entry matches. Any other failure is raised, so that it is
+    # not cached as a search without results.
+    if response.status_code == 204:
+        return []
+    response.raise_for_status()
+    pdb_response = response.json()
 
-    try:
-        pdb_response = json.loads(requests.get(
-            f"https://search.rcsb.org/rcsbsearch/v2/query?json={json.dumps(query, separators=(',', ':'))}").text
-        )
-    except json.JSONDecodeError:
-        return structures
-
-    for pdb_result in pdb_response["result_set"]:
-        pdb_id = pdb_result["identifier"]
-        score = pdb_result["score"]
-        structure = requests.get(f"https://files.rcsb.org/download/{pdb_id}.pdb.gz").content
-        try:
-            structures[pdb_id] = {"score": score, "structure": gzip.decompress(structure).decode()}
-        except gzip.BadGzipFile:
-            continue
-    return structures
+    structures = [(pdb_result["identifier"], pdb_result["score"]) for pdb_result in pdb_response["result_set"]]
+    return sorted(structures, key=lambda x: x[1], reverse=True)[:top_k]
 
 
 @st.cache_resource
+def load_structure_cache() -> StructureCache:
+    """
+    Open the structure cache, shared by all sessions of this process.
+    :return: The structure cache.
+    """
+    return StructureCache()
+
+
+def download_protein_structure(pdb_id: str) -> Optional[bytes]:
+    """
+    Download a compressed protein structure from the PDB and add it to the structure cache.
+    :param pdb_id: The PDB ID of the structure.
+    :return: The gzip-compressed structure in PDB format, or None if it could not be downloaded.
+    """
+    try:
+        response = http_client.get(f"https://files.rcsb.org/download/{pdb_id}.pdb.gz", timeout=structure_request_timeout)
+    except requests.RequestException:
+        return None
+    if response.status_code != 200 or not response.content.startswith(b"\x1f\x8b"):
+        return None
+    load_structure_cache().put(pdb_id, response.content)
+    return response.content
+
+
+def prefetch_protein_structures(pdb_ids: list[str]) -> None:
+    """
+    Start downloading protein structures that are not cached yet in the background.
+    :param pdb_ids: The PDB IDs of the structures to download.
+    :return: None.
+    """
+    structure_cache = load_structure_cache()
+    with pending_structure_downloads_lock:
+        for pdb_id in pdb_ids:
+            if pdb_id not in pending_structure_downloads and pdb_id not in structure_cache:
+                download = structure_download_pool.submit(download_protein_structure, pdb_id)
+                pending_structure_downloads[pdb_id] = download
+                download.add_done_callback(lambda _, pdb_id=pdb_id: finish_structure_download(pdb_id))
+
+
+def finish_structure_download(pdb_id: str) -> None:
+    """
+    Forget a finished background download. Its result, if any, is in the structure cache.
+    :param pdb_id: The PDB ID of the structure.
+    :return: None.
+    """
+    with pending_structure_downloads_lock:
+        pending_structure_downloads.pop(pdb_id, None)
+
+
+def load_protein_structure(pdb_id: str) -> Optional[str]:
+    """
+    Retrieve a protein structure from the structure cache, waiting for its download if it is in progress
+    or downloading it otherwise. The structure is only decompressed here, right before rendering.
+    :param pdb_id: The PDB ID of the structure.
+    :return: The structure in PDB format, or None if it could not be downloaded.
+    """
+    structure = load_structure_cache().get(pdb_id)
+    if structure is None:
+        with pending_structure_downloads_lock:
+            download = pending_structure_downloads.get(pdb_id)
+        structure = download.result() if download is not None else download_protein_structure(pdb_id)
+    if structure is None:
+        return None
+    try:
+        return gzip.decompress(structure).decode()
+    except gzip.BadGzipFile:
+        return None
+
+
+@st.cache_resource(max_entries=16)
+def load_parsed_structure(pdb_id: str) -> ParsedStructure:
+    """
+    Retrieve and parse a protein structure once, so every display style can be derived from it.
+    :param pdb_id: The PDB ID of the structure.
+    :return: The parsed structure.
+    :raises LookupError: If the structure could not be downloaded. Failures are not cached.
+    """
+    structure = load_protein_structure(pdb_id)
+    if structure is None:
+        raise LookupError(f"Could not download structure {pdb_id}")
+    return parse_pdb(structure)
+
+
 def render_py3DMol(molecule: str, visualization_type: str, colorscheme: int, string_format: str = "pdb",
                    viewer_dimensions: dict = None) -> py3Dmol.view:
     """
@@ -128,14 +269,32 @@ def render_py3DMol(molecule: str, visualization_type: str, colorscheme: int, str
     return viewer
 
 
-def reset_view(viewer: py3Dmol.view) -> None:
+@st.cache_data(max_entries=64)
+def render_structure_html(pdb_id: str, visualization_type: str, colorscheme: Optional[int], show_solvent: bool,
+                          height: int) -> bytes:
     """
-    Reset a py3Dmol visualization to its default state.
-    :param viewer: The view object to reset.
+    Render a protein structure as a standalone py3Dmol HTML page.
+    Keyed on the PDB ID and display parameters only, so that cache lookups do not hash the structure itself.
+    :param pdb_id: The PDB ID of the structure.
+    :param visualization_type: the type of visualization to render. One of {"cartoon", "stick", "sphere"}.
+    :param colorscheme: the color scheme to show in cartoon visualizations, see render_py3DMol.
+    :param show_solvent: Whether to display solvent molecules.
+    :param height: Height of the viewer in pixels.
+    :return: The UTF-8 encoded HTML.
+    :raises LookupError: If the structure could not be downloaded.
+    """
+    structure = load_parsed_structure(pdb_id)
+    viewer = render_py3DMol(reduce_structure(structure, visualization_type, show_solvent), visualization_type,
+                            colorscheme, viewer_dimensions={"height": height})
+    return viewer._make_html().encode()
+
+
+def reset_view() -> None:
+    """
+    Reset the py3Dmol visualization to its default state, by making the next rerun reload the viewer.
     :return: None.
     """
-    viewer.removeAllLabels()
-    viewer.zoomTo()
+    st.session_state["structure_view_resets"] = st.session_state.get("structure_view_resets", 0) + 1
 
 
 def generate_protein_structure_view(uniprot_id: str) -> None:
@@ -145,9 +304,13 @@ def generate_protein_structure_view(uniprot_id: str) -> None:
     :return: None.
     """
     seq = load_protein_sequence(uniprot_id)
-    structures = load_protein_structures(seq)
+    try:
+        structures = search_protein_structures(seq)
+    except requests.RequestException:
+        st.write(f"The structure search for UniProt ID {uniprot_id} failed, please try again later")
+        return
 
-    matched_structures = {k: v for k, v in structures.items() if v["score"] > 0.0}
+    matched_structures = {k: v for k, v in structures if v > 0.0}
 
     if len(matched_structures) > 0:
         select, style, view = st.columns([2, 3, 8])
@@ -155,20 +318,32 @@ def generate_protein_structure_view(uniprot_id: str) -> None:
             structure_selector = st.radio(f"Found {len(matched_structures)} sequence matches for UniProt ID {uniprot_id}",
                                       options=matched_structures.keys(), horizontal=True,
                                       format_func=lambda
-                                          x: f"{x} - {matched_structures[x]['score'] * 100:.2f}%")
+                                          x: f"{x} - {matched_structures[x] * 100:.2f}%")
+            # While the selected structure loads, download the next few in the ranking, which are the likely next picks.
+            ranking = list(matched_structures.keys())
+            selected_rank = ranking.index(structure_selector)
+            prefetch_protein_structures(ranking[selected_rank + 1:selected_rank + structure_prefetch_count + 1])
         with style:
             visualization_type = st.selectbox("Structure View", options=["cartoon", "stick", "sphere"],
                                           format_func=lambda x: f"{x.title()} model")
             if visualization_type == "cartoon":
                 colorscheme = st.radio("Color", options=[0, 1, 2],
                                        format_func=lambda x: ["Amino acids", "Secondary structure", "Monomers"][x])
+                show_solvent = False
             else:
                 colorscheme = None
+                show_solvent = st.checkbox("Show solvent")
         with view:
             viewer_dimensions = {"height": 500}
-            viewer = render_py3DMol(structures[structure_selector]["structure"], visualization_type, colorscheme,
-                                    viewer_dimensions=viewer_dimensions)
-            components.html(viewer._make_html(), **viewer_dimensions)
-            st.columns(3)[1].button("Reset view", on_click=lambda: reset_view(viewer))
+            try:
+                viewer_html = render_structure_html(structure_selector, visualization_type, colorscheme, show_solvent,
+                                                    **viewer_dimensions).decode()
+            except LookupError as error:
+                st.write(str(error))
+                return
+            # A changed page makes the browser reload the viewer, dropping any zoom and labels.
+            resets = st.session_state.get("structure_view_resets", 0)
+            components.html(f"{viewer_html}<!-- reset {resets} -->", **viewer_dimensions)
+            st.columns(3)[1].button("Reset view", on_click=reset_view)
     else:
         st.write(f"No structure found for UniProt ID {uniprot_id}")
\ No newline at end of file
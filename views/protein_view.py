@@ -1,6 +1,9 @@
 import streamlit as st
 
+from data.filter_cache import filter_key
+from data.gene_search import search_genes
 from views.protein_details_view import generate_protein_details_view
+from views.protein_prefetch import prefetch_proteins, top_filtered_proteins
 from views.protein_sequence_view import generate_protein_sequence_view
 from views.protein_structure_view import generate_protein_structure_view
 
@@ -11,20 +14,41 @@ def generate_protein_view() -> None:
     :return: None
     """
 
-    data = st.session_state["data"]
+    dataset = st.session_state["dataset"]
+    filter_cache = st.session_state["filter_cache"]
+    cancer_selection = st.session_state["cancer_selection"]
+    prognosis_selection = st.session_state["prognosis_selection"]
+    protein_selection = st.session_state["protein_selection"]
+    data = dataset.data
 
     st.header("Protein Details")
 
-
-    gene = st.selectbox("Gene name", options=data["Gene"].unique())
-    uniprot_id = data[data["Gene"] == gene].iloc[0]["Uniprot"]
+    # Only the best matches of the typed query are sent to the browser, instead of every gene.
+    search_col, gene_col = st.columns(2)
+    query = search_col.text_input("Gene name", placeholder="Gene symbol, synonym or UniProt ID")
+    candidates = search_genes(dataset.gene_search, query)
+    if len(candidates) == 0:
+        st.write(f"No gene found for {query}")
+        return
+    row = gene_col.selectbox("Matching genes", options=candidates,
+                             format_func=lambda row: f"{data['Gene'].iat[row]} ({data['Uniprot'].iat[row]})")
+    uniprot_id = data["Uniprot"].iat[row]
+
+    # Fetch the sequence and structures of the selected protein while the details are rendered, and warm the caches
+    # for the genes of the current filter that are the likely next selections.
+    prefetch_proteins([uniprot_id])
+    likely_selections = filter_cache.get(
+        dataset.version, filter_key("prefetch", cancer_selection, prognosis_selection, protein_selection),
+        lambda: top_filtered_proteins(dataset, cancer_selection, prognosis_selection, protein_selection)
+    )
+    prefetch_proteins([x for x in likely_selections if x != uniprot_id], speculative=True)
 
     info_view, sequence_view = st.columns(2)
 
     structure_view = st.container()
 
     with info_view:
-        generate_protein_details_view(uniprot_id, data)
+        generate_protein_details_view(uniprot_id, dataset)
 
     with sequence_view:
         st.subheader("Protein Sequence")